@@ -1,35 +1,97 @@
+import base64
+import csv
 import datetime
+import io
+import sys
+import time
 import uuid
-from functools import wraps
+from functools import partial, wraps
+import click
 import dateparser
 import jwt
-from flask import Flask, jsonify, request
+from flask import Flask, abort, json, jsonify, make_response, request, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import make_transient_to_detached
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from src import error_codes
-from src.validator import valid_password, is_valid, valid_role
+from src.cache import TTLCache, Versions
+from src.hashing import HashPool, PoolFull
+from src.validator import valid_password, is_valid, is_valid_many, valid_role, valid_capacity
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = '>kz9q>GnW<>~_.7,8cw_-/xA'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///..\\db\\fenrir.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 15}}
+app.config['TOKEN_CACHE_SIZE'] = 1024
+app.config['TOKEN_CACHE_TTL'] = 300
+app.config['REVOKED_USER_CACHE_SIZE'] = 10000
+app.config['UNKNOWN_USER_CACHE_SIZE'] = 10000
+app.config['UNKNOWN_USER_CACHE_TTL'] = 600
+app.config['ACCESS_TOKEN_LIFETIME'] = datetime.timedelta(minutes=15)
+app.config['REFRESH_TOKEN_LIFETIME'] = datetime.timedelta(weeks=50)
+app.config['WORKOUT_CAPACITY'] = 12
+app.config['MAX_SCHEDULE_SPAN_DAYS'] = 42
+app.config['MAX_BATCH_BOOKINGS'] = 50
+app.config['MAX_IMPORT_ROWS'] = 50000
+app.config['MAX_TEMPLATE_CLASSES'] = 200
+app.config['MAX_TEMPLATE_SPAN_DAYS'] = 366
+app.config['IMPORT_CHUNK_SIZE'] = 500
+app.config['PAGE_SIZE'] = 20
+app.config['MAX_PAGE_SIZE'] = 100
+app.config['STREAM_BATCH_SIZE'] = 100
+app.config['SCHEDULE_CACHE_SIZE'] = 512
+app.config['SCHEDULE_CACHE_TTL'] = 3600
+app.config['STAFF_CACHE_TTL'] = 3600
+app.config['SERIES_CACHE_TTL'] = 3600
+app.config['HASH_WORKERS'] = 4
+# A request thread waits for its hash, so up to HASH_WORKERS + HASH_QUEUE_DEPTH
+# request threads can be held by logins; keep that well below the server's thread count
+app.config['HASH_QUEUE_DEPTH'] = 4
+app.config['HASH_RETRY_AFTER'] = 1
 db = SQLAlchemy(app)
 
+token_cache = TTLCache(maxsize=app.config['TOKEN_CACHE_SIZE'], ttl=app.config['TOKEN_CACHE_TTL'])
+revoked_users = TTLCache(maxsize=app.config['REVOKED_USER_CACHE_SIZE'], ttl=app.config['ACCESS_TOKEN_LIFETIME'].total_seconds())
+unknown_users = TTLCache(maxsize=app.config['UNKNOWN_USER_CACHE_SIZE'], ttl=app.config['UNKNOWN_USER_CACHE_TTL'])
+schedule_cache = TTLCache(maxsize=app.config['SCHEDULE_CACHE_SIZE'], ttl=app.config['SCHEDULE_CACHE_TTL'])
+staff_cache = TTLCache(maxsize=1, ttl=app.config['STAFF_CACHE_TTL'])
+series_cache = TTLCache(maxsize=1, ttl=app.config['SERIES_CACHE_TTL'])
+schedule_versions = Versions()
+roster_versions = Versions()
+boot_id = uuid.uuid4().hex[:8]
+hash_pool = HashPool(workers=app.config['HASH_WORKERS'], max_queue=app.config['HASH_QUEUE_DEPTH'])
+
 participates = db.Table(
     'Participates',
     db.Column('u_id', db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True),
     db.Column('w_id', db.Integer, db.ForeignKey('workout.id', ondelete='CASCADE'), primary_key=True),
 )
 
+waitlist = db.Table(
+    'Waitlist',
+    db.Column('w_id', db.Integer, db.ForeignKey('workout.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('position', db.Integer, primary_key=True),
+    db.Column('u_id', db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False),
+    db.UniqueConstraint('w_id', 'u_id'),
+)
+
+series_exceptions = db.Table(
+    'SeriesException',
+    db.Column('series_id', db.Integer, db.ForeignKey('workout_series.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('day', db.DateTime, primary_key=True),
+    db.Column('workout_id', db.Integer, db.ForeignKey('workout.id', ondelete='SET NULL'), nullable=True),
+)
+
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True, nullable=False)
     open_id = db.Column(db.String(50), unique=True, nullable=False)
-    name = db.Column(db.String(50), primary_key=False, nullable=False)
+    name = db.Column(db.String(50), primary_key=False, nullable=False, index=True)
     ssn = db.Column(db.String(10), unique=True, nullable=False)
     password = db.Column(db.String(100), primary_key=False, nullable=False)
-    user_role = db.Column(db.String(12), primary_key=False, nullable=False, default='Client')
+    user_role = db.Column(db.String(12), primary_key=False, nullable=False, default='Client', index=True)
     start_date = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow())
     expire_date = db.Column(db.DateTime, nullable=False, default=datetime.datetime.utcnow())
     workouts = db.relationship('Workout', secondary=participates, lazy='dynamic',
@@ -37,28 +99,729 @@ class User(db.Model):
 
 
 class Workout(db.Model):
+    __table_args__ = (db.Index('ix_workout_coach_id_date_time', 'coach_id', 'date_time'),)
     id = db.Column(db.Integer, primary_key=True, nullable=False)
     coach_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     date_time = db.Column(db.DateTime(), unique=True, nullable=False)
     description = db.Column(db.Text, primary_key=False, nullable=False)
+    attending = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    capacity = db.Column(db.Integer, nullable=False, default=app.config['WORKOUT_CAPACITY'],
+                         server_default=str(app.config['WORKOUT_CAPACITY']))
+    waitlisted = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    series_id = db.Column(db.Integer, db.ForeignKey('workout_series.id'), nullable=True, index=True)
+    coach = db.relationship('User', foreign_keys=[coach_id])
     users = db.relationship('User', secondary=participates, lazy='dynamic',
                             backref=db.backref('users', lazy='dynamic'))
 
 
+class WorkoutSeries(db.Model):
+    id = db.Column(db.Integer, primary_key=True, nullable=False)
+    coach_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    weekday = db.Column(db.Integer, nullable=False)
+    time = db.Column(db.Time, nullable=False)
+    description = db.Column(db.Text, nullable=False)
+    capacity = db.Column(db.Integer, nullable=False, default=app.config['WORKOUT_CAPACITY'])
+    starts = db.Column(db.DateTime, nullable=False)
+    ends = db.Column(db.DateTime, nullable=True)
+    coach = db.relationship('User', foreign_keys=[coach_id])
+
+
+def reset_caches():
+    """
+    Empties every in-process cache. Used when the
+    database is recreated, e.g. between tests.
+    """
+    token_cache.clear()
+    revoked_users.clear()
+    unknown_users.clear()
+    schedule_cache.clear()
+    staff_cache.clear()
+    series_cache.clear()
+
+
+def forget_user(open_id):
+    """
+    Drops every cached token belonging to a user. Must be
+    called whenever that user is changed or removed.
+
+    :param open_id: the open_id of the user
+    """
+    token_cache.discard_where(lambda entry: entry[0]['open_id'] == open_id)
+
+
+def revoke_user(open_id):
+    """
+    Like forget_user, but also rejects the access tokens the
+    user already holds, since their role claim may be stale.
+    The user has to refresh to get a new access token. The time
+    is kept with the sub-second precision of the iat claim, so a
+    token issued earlier in the same second is rejected and one
+    issued after the revocation is accepted. The revocation is
+    forgotten once the cache has to evict it, which makes the old
+    tokens valid again, so REVOKED_USER_CACHE_SIZE must exceed the
+    number of users revoked within ACCESS_TOKEN_LIFETIME.
+
+    :param open_id: the open_id of the user
+    """
+    forget_user(open_id)
+    revoked_users.set(open_id, time.time())
+
+
+def forget_staff():
+    """
+    Drops the cached list of coaches and admins. Must be called
+    whenever a user who is or becomes a non-Client is changed,
+    created or removed.
+    """
+    staff_cache.clear()
+
+
+def forget_schedule(day=None):
+    """
+    Marks the cached schedule of a day as out of date. Must be
+    called whenever a workout on that day or its attendance
+    changes. Without a day every cached schedule is dropped.
+
+    :param day: a datetime on the day, or None for every day
+    """
+    schedule_versions.bump(None if day is None else day.date())
+
+
+def forget_series():
+    """
+    Drops the cached workout series and every cached schedule.
+    Must be called whenever a series or the name of its coach
+    changes.
+    """
+    series_cache.clear()
+    forget_schedule()
+
+
+def forget_roster(workout_id=None):
+    """
+    Marks the participant list of a workout as changed. Without
+    a workout_id every participant list is marked as changed.
+
+    :param workout_id: the id of the workout or None
+    """
+    roster_versions.bump(None if workout_id is None else str(workout_id))
+
+
+def version_tag(versions, key):
+    """
+    Builds an ETag out of the version of key. The tag includes
+    an id of this process, since versions restart from zero.
+
+    :param versions: the Versions holding the key
+    :param key: the key to build the tag for
+    :return: the tag
+    """
+    generation, version = versions.get(key)
+    return '{0}-{1}-{2}-{3}'.format(boot_id, key, generation, version)
+
+
+def not_modified(tag):
+    """
+    Checks the If-None-Match header field against tag.
+
+    :param tag: the current ETag of the requested resource
+    :return: a 304 response if the client has the current
+    version, otherwise None
+    """
+    if not request.if_none_match.contains(tag):
+        return None
+    response = app.response_class(status=304)
+    response.set_etag(tag)
+    return response
+
+
+def with_etag(response, tag):
+    response.set_etag(tag)
+    return response
+
+
+def keyset_batches(query, column):
+    """
+    Iterates the rows of query in order of column, which must be
+    unique and selected by query, reading STREAM_BATCH_SIZE rows at
+    a time. Every batch is read in full before its rows are handed
+    out, which finishes its statement, and SQLite drops the read lock
+    of a finished statement unless the session has written, so no lock
+    is held while a streamed response waits for a slow client and
+    bookings are not blocked. Rows changed between two batches may be
+    seen in either state.
+
+    :param query: the query of the rows, not yet ordered or limited
+    :param column: the unique column to order and continue by
+    :return: a generator of the rows
+    """
+    size = app.config['STREAM_BATCH_SIZE']
+    after = None
+    while True:
+        batch = query if after is None else query.filter(column > after)
+        batch = batch.order_by(column).limit(size).all()
+        for row in batch:
+            yield row
+        if len(batch) < size:
+            return
+        after = getattr(batch[-1], column.key)
+
+
+def stream_json(envelope, key, rows, serialize):
+    """
+    Builds the same response as jsonify(envelope) with the list
+    serialize(row) for row in rows under key, but writes the list
+    one batch of rows at a time as rows is iterated, so neither
+    the whole list nor the whole string is held in memory.
+
+    :param envelope: the other keys of the json object
+    :param key: the key of the list
+    :param rows: an iterable of rows, e.g. from keyset_batches
+    :param serialize: turns a row into a json serializable value
+    :return: the streaming response
+    """
+    if app.config['JSONIFY_PRETTYPRINT_REGULAR'] or app.debug:
+        return jsonify(dict(envelope, **{key: [serialize(row) for row in rows]}))
+    separators = (',', ':')
+    marker = '\x00' + key
+    head, tail = json.dumps(dict(envelope, **{key: marker}), separators=separators).split(json.dumps(marker))
+
+    def generate():
+        chunk = [head, '[']
+        for i, row in enumerate(rows):
+            if i:
+                chunk.append(',')
+            chunk.append(json.dumps(serialize(row), separators=separators))
+            if len(chunk) >= 2 * app.config['STREAM_BATCH_SIZE']:
+                yield ''.join(chunk)
+                chunk = []
+        chunk += [']', tail, '\n']
+        yield ''.join(chunk)
+
+    return app.response_class(stream_with_context(generate()), mimetype=app.config['JSONIFY_MIMETYPE'])
+
+
+def find_user(open_id):
+    """
+    Looks up a user by open_id, remembering the open_ids that
+    turn out not to exist so that stale tokens of removed users
+    do not hit the database on every retry.
+
+    :param open_id: the open_id of the user
+    :return: the User or None
+    """
+    if unknown_users.get(open_id) is not None:
+        return None
+    user = User.query.filter_by(open_id=open_id).first()
+    if user is None:
+        unknown_users.set(open_id, True)
+    return user
+
+
+def user_snapshot(user):
+    """
+    Copies the column values of a user into a new detached
+    instance that can be cached and merged into any session
+    later on without a query.
+
+    :param user: a loaded User
+    :return: a detached copy of the user
+    """
+    snapshot = User(**{c.key: getattr(user, c.key) for c in User.__table__.columns})
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+class Principal:
+    """
+    The session user as described by the claims of its token.
+    Anything that is not in the claims is read from the User
+    row, which is only loaded the first time it is needed.
+    """
+
+    def __init__(self, id, open_id, user_role, user=None):
+        self.id = id
+        self.open_id = open_id
+        self.user_role = user_role
+        self._user = user
+
+    @property
+    def user(self):
+        if self._user is None:
+            self._user = User.query.get(self.id)
+            if self._user is None:
+                unknown_users.set(self.open_id, True)
+                abort(make_response(jsonify({'error': error_codes.no_such_user}), 401))
+        return self._user
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+
+def issue_tokens(user):
+    """
+    Creates a short lived access token carrying the id and role
+    of the user and a long lived refresh token. The iat claim of
+    the access token keeps fractions of a second for revoke_user.
+
+    :param user: the user to issue the tokens for
+    :return: a tuple of the access token and the refresh token
+    """
+    now = datetime.datetime.utcnow()
+    access = jwt.encode(
+        {
+            'open_id': user.open_id,
+            'id': user.id,
+            'role': user.user_role,
+            'type': 'access',
+            'iat': time.time(),
+            'exp': now + app.config['ACCESS_TOKEN_LIFETIME']
+        },
+        app.config['SECRET_KEY'],
+        algorithm='HS256'
+    )
+    refresh = jwt.encode(
+        {'open_id': user.open_id, 'type': 'refresh', 'exp': now + app.config['REFRESH_TOKEN_LIFETIME']},
+        app.config['SECRET_KEY'],
+        algorithm='HS256'
+    )
+    return access.decode('UTF-8'), refresh.decode('UTF-8')
+
+
+def parse_day(day):
+    """
+    Parses a date of the form '2001-09-11' into the
+    datetime at the start of that day. The last representable
+    day is rejected, since the callers need the start of the
+    day after it.
+
+    :param day: the date string from the url
+    :return: the datetime or None if day is not a valid date
+    """
+    try:
+        year, month, date = map(int, day.split('-'))
+        start = datetime.datetime(year, month, date)
+    except (TypeError, ValueError):
+        return None
+    return None if start.date() == datetime.date.max else start
+
+
+def schedule_query(start, end):
+    """
+    Builds a single statement that fetches the workouts in
+    [start, end) together with the name of their coach, ordered
+    by time.
+
+    :param start: the first datetime included
+    :param end: the first datetime not included
+    :return: a query of rows with the keys of workout_dict
+    """
+    return workout_rows().filter(
+        Workout.date_time >= start, Workout.date_time < end
+    ).order_by(Workout.date_time)
+
+
+def workout_rows():
+    """
+    Builds a query of workouts joined with the name of their coach.
+    The coach_id of a row is the open_id of the coach, the id that
+    create_workout and admin_update_workout take. A workout whose
+    coach no longer exists is kept with coach_id and coach_name None.
+
+    :return: a query of rows with the keys of workout_dict
+    """
+    return db.session.query(
+        Workout.id,
+        User.name.label('coach_name'),
+        User.open_id.label('coach_id'),
+        Workout.description,
+        Workout.date_time,
+        Workout.attending,
+        Workout.capacity,
+        Workout.waitlisted,
+        Workout.series_id
+    ).outerjoin(Workout.coach)
+
+
+def workout_dict(row):
+    """
+    Turns a row of schedule_query into the dictionary
+    sent by the schedule endpoints.
+
+    :param row: a row of schedule_query
+    :return: a dictionary describing the workout
+    """
+    return {
+        'id': row.id,
+        'coach_name': row.coach_name,
+        'coach_id': row.coach_id,
+        'description': row.description,
+        'date_time': row.date_time,
+        'attending': row.attending,
+        'capacity': row.capacity,
+        'waitlisted': row.waitlisted,
+        'series_id': row.series_id
+    }
+
+
+def load_series():
+    """
+    Gets every workout series together with the name of its
+    coach, which is None if the coach no longer exists. The series are few and rarely change, so they are
+    kept in series_cache until forget_series is called.
+
+    :return: a list of rows with the columns of WorkoutSeries
+    and coach_name and coach_open_id
+    """
+    series = series_cache.get('series')
+    if series is None:
+        series = db.session.query(
+            WorkoutSeries.id,
+            User.name.label('coach_name'),
+            User.open_id.label('coach_open_id'),
+            WorkoutSeries.coach_id,
+            WorkoutSeries.weekday,
+            WorkoutSeries.time,
+            WorkoutSeries.description,
+            WorkoutSeries.capacity,
+            WorkoutSeries.starts,
+            WorkoutSeries.ends
+        ).outerjoin(WorkoutSeries.coach).all()
+        series_cache.set('series', series)
+    return series
+
+
+def occurrences(series, start, end):
+    """
+    Lists the times the rule of a series gives in [start, end),
+    ignoring its exceptions.
+
+    :param series: a WorkoutSeries or a row of load_series
+    :param start: the start of the first day included
+    :param end: the start of the first day not included
+    :return: a generator of datetimes
+    """
+    first = max(start, series.starts)
+    last = end if series.ends is None else min(end, series.ends)
+    day = first + datetime.timedelta(days=(series.weekday - first.weekday()) % 7)
+    while day < last:
+        yield datetime.datetime.combine(day.date(), series.time)
+        day += datetime.timedelta(weeks=1)
+
+
+def series_dict(series, date_time):
+    """
+    Builds the dictionary sent by the schedule endpoints for an
+    occurrence of a series that is not yet a Workout. It has no
+    id, it is booked through the series_id and its day.
+
+    :param series: a row of load_series
+    :param date_time: the time of the occurrence
+    :return: a dictionary with the keys of workout_dict
+    """
+    return {
+        'id': None,
+        'coach_name': series.coach_name,
+        'coach_id': series.coach_open_id,
+        'description': series.description,
+        'date_time': date_time,
+        'attending': 0,
+        'capacity': series.capacity,
+        'waitlisted': 0,
+        'series_id': series.id
+    }
+
+
+def series_occurrences(start, end, coach_id=None):
+    """
+    Lists the occurrences of the workout series in [start, end)
+    that are not cancelled and not already a Workout. The exceptions
+    of the series are only read if a series has an occurrence in
+    the range.
+
+    :param start: the start of the first day included
+    :param end: the start of the first day not included
+    :param coach_id: only the series of this coach, if given
+    :return: a list of (row of load_series, datetime)
+    """
+    candidates = [
+        (series, date_time) for series in load_series() if coach_id is None or series.coach_id == coach_id
+        for date_time in occurrences(series, start, end)
+    ]
+    if not candidates:
+        return candidates
+    skipped = set(db.session.query(series_exceptions.c.series_id, series_exceptions.c.day).filter(
+        series_exceptions.c.day >= start, series_exceptions.c.day < end))
+    return [
+        (series, date_time) for series, date_time in candidates
+        if (series.id, datetime.datetime.combine(date_time.date(), datetime.time())) not in skipped
+    ]
+
+
+def series_class_at(date_time):
+    """
+    Checks whether one of the series_occurrences is at date_time,
+    so a workout there would hide it.
+
+    :param date_time: the time of the workout
+    :return: True iff there is such an occurrence
+    """
+    day = datetime.datetime.combine(date_time.date(), datetime.time())
+    return any(occurrence == date_time for _, occurrence in series_occurrences(day, day + datetime.timedelta(days=1)))
+
+
+def schedule(start, end, coach_id=None):
+    """
+    Gets the workouts in [start, end) in order of time: the rows
+    of schedule_query and the series_occurrences that are not at the
+    time of another workout. An occurrence is hidden by a workout of
+    any coach, so the schedule of a coach agrees with the full one.
+
+    :param start: the start of the first day included
+    :param end: the start of the first day not included
+    :param coach_id: only the workouts of this coach, if given
+    :return: a list of dictionaries as made by workout_dict
+    """
+    rows = schedule_query(start, end)
+    if coach_id is not None:
+        rows = rows.filter(Workout.coach_id == coach_id)
+    workouts = [workout_dict(row) for row in rows]
+    candidates = series_occurrences(start, end, coach_id)
+    if not candidates:
+        return workouts
+    if coach_id is None:
+        taken = {workout['date_time'] for workout in workouts}
+    else:
+        taken = {date_time for date_time, in db.session.query(Workout.date_time).filter(
+            Workout.date_time >= start, Workout.date_time < end)}
+    workouts += [series_dict(series, date_time) for series, date_time in candidates if date_time not in taken]
+    return sorted(workouts, key=lambda workout: workout['date_time'])
+
+
+USER_FIELDS = ('name', 'ssn', 'open_id', 'user_role', 'start_date', 'expire_date')
+
+
+def user_fields():
+    """
+    Reads the fields query parameter of the user list endpoints,
+    a comma separated list of the keys of user_dict to send.
+
+    :return: the tuple of fields, all of USER_FIELDS if the
+    parameter is missing, or None if it names an unknown field
+    """
+    if 'fields' not in request.args:
+        return USER_FIELDS
+    fields = tuple(dict.fromkeys(field.strip() for field in request.args['fields'].split(',')))
+    if any(field not in USER_FIELDS for field in fields):
+        return None
+    return fields
+
+
+def user_rows(fields=USER_FIELDS):
+    """
+    Builds a query of the id and the given columns of User,
+    so no User objects are loaded and no other column is decoded.
+
+    :param fields: the names of the columns
+    :return: a query of rows with the keys of user_dict
+    """
+    return db.session.query(User.id, *[getattr(User, field) for field in fields])
+
+
+def user_dict(row, fields=USER_FIELDS):
+    """
+    Turns a row of user_rows into the dictionary
+    sent by the user list endpoints.
+
+    :param row: a row of user_rows
+    :param fields: the keys to send
+    :return: a dictionary describing the user
+    """
+    return {field: getattr(row, field) for field in fields}
+
+
+def begin_immediate():
+    """
+    Starts the transaction of the session by taking the SQLite
+    write lock, so that what is read in the transaction can not
+    change before it commits. Concurrent writers wait for the
+    lock (up to the busy timeout) instead of failing at commit.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite' and not connection.connection.in_transaction:
+        connection.execute('BEGIN IMMEDIATE')
+
+
+def promote_waitlist(workout_id):
+    """
+    Moves users from the head of the waitlist of a workout to its
+    participants for as long as the workout has room. Must run in
+    the transaction that made the room, after begin_immediate.
+
+    :param workout_id: the id of the workout
+    :return: the ids of the promoted users
+    """
+    promoted = []
+    while True:
+        head = db.session.query(waitlist.c.u_id, waitlist.c.position).filter(
+            waitlist.c.w_id == workout_id).order_by(waitlist.c.position).first()
+        if head is None:
+            return promoted
+        has_room = Workout.query.filter(Workout.id == workout_id, Workout.attending < Workout.capacity)
+        if not has_room.update({Workout.attending: Workout.attending + 1, Workout.waitlisted: Workout.waitlisted - 1},
+                               synchronize_session=False):
+            return promoted
+        db.session.execute(waitlist.delete().where(
+            db.and_(waitlist.c.w_id == workout_id, waitlist.c.position == head.position)))
+        db.session.execute(participates.insert().values(u_id=head.u_id, w_id=workout_id))
+        promoted.append(head.u_id)
+
+
+def check_attendance(fix=False):
+    """
+    Recounts the participants of every workout from the
+    Participates table and compares them to Workout.attending.
+
+    :param fix: if True the recounted numbers are stored
+    :return: a list of (workout id, attending, participants)
+    for every workout where the two differ
+    """
+    participants = db.func.count(participates.c.u_id)
+    rows = db.session.query(Workout.id, Workout.attending, participants).outerjoin(
+        participates, participates.c.w_id == Workout.id
+    ).group_by(Workout.id).having(Workout.attending != participants).all()
+    if fix and rows:
+        for workout_id, _, count in rows:
+            Workout.query.filter_by(id=workout_id).update({Workout.attending: count}, synchronize_session=False)
+        db.session.commit()
+        forget_schedule()
+    return [tuple(row) for row in rows]
+
+
+def check_coach_ids(fix=False):
+    """
+    Finds the workouts that still store the open_id of their coach
+    in Workout.coach_id, as create_workout used to, instead of the
+    id of the coach. Such workouts do not join their coach and are
+    sent without one.
+
+    :param fix: if True the open_ids are replaced by the ids of
+    the coaches they belong to
+    :return: a list of (workout id, coach_id, id of the coach or
+    None if no user has that open_id) for every such workout
+    """
+    coach = db.session.query(User.id).filter(User.open_id == Workout.coach_id).correlate(Workout).as_scalar()
+    rows = db.session.query(Workout.id, db.cast(Workout.coach_id, db.String), coach).filter(
+        db.func.typeof(Workout.coach_id) == 'text').all()
+    if fix and any(user_id is not None for _, _, user_id in rows):
+        Workout.query.filter(db.func.typeof(Workout.coach_id) == 'text', coach.isnot(None)).update(
+            {Workout.coach_id: coach}, synchronize_session=False)
+        db.session.commit()
+        forget_schedule()
+    return [tuple(row) for row in rows]
+
+
+CURSOR_TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+def encode_cursor(values):
+    """
+    Packs the sort key of the last row of a page into an
+    opaque string the client sends back for the next page.
+
+    :param values: a list of json serializable values
+    :return: the cursor
+    """
+    return base64.urlsafe_b64encode(json.dumps(values).encode('UTF-8')).decode('UTF-8')
+
+
+def decode_cursor(cursor):
+    """
+    Unpacks a cursor made by encode_cursor.
+
+    :param cursor: the cursor sent by the client
+    :return: the list of values or None if the cursor is invalid
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('UTF-8')).decode('UTF-8'))
+    except (TypeError, ValueError):
+        return None
+    return values if type(values) == list else None
+
+
+def keyset_after(columns, values, descending=False):
+    """
+    Builds the filter for the rows that come after values when
+    ordered by columns, i.e. the row value comparison
+    (columns) > (values), or < when descending.
+
+    :param columns: the columns of the sort key
+    :param values: the sort key of the last row already sent
+    :param descending: whether the rows are in descending order
+    :return: the filter clause
+    """
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [prior == value for prior, value in zip(columns[:i], values[:i])]
+        clauses.append(db.and_(*equal, column < values[i] if descending else column > values[i]))
+    return db.or_(*clauses)
+
+
+def page_size():
+    """
+    Reads the limit query parameter, bounded by MAX_PAGE_SIZE.
+
+    :return: the number of rows to send in one page
+    """
+    limit = request.args.get('limit', app.config['PAGE_SIZE'], type=int)
+    return max(1, min(limit, app.config['MAX_PAGE_SIZE']))
+
+
+def server_busy():
+    """
+    The response sent when the hashing pool is full.
+
+    :return: a 503 response asking the client to retry later
+    """
+    return jsonify({'error': error_codes.server_busy}), 503, {'Retry-After': str(app.config['HASH_RETRY_AFTER'])}
+
+
 def authenticated(fun):
     @wraps(fun)
     def decorated(*args, **kwargs):
         if 'fenrir-token' not in request.headers:
             return jsonify({'error': error_codes.missing_token}), 401
         token = request.headers['fenrir-token']
-        try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms='HS256')
-            curr_user = User.query.filter_by(open_id=data['open_id']).first()
-            if curr_user:
-                return fun(curr_user, *args, **kwargs)
+        cached = token_cache.get(token)
+        if cached is None:
+            try:
+                data = jwt.decode(token, app.config['SECRET_KEY'], algorithms='HS256')
+            except jwt.ExpiredSignatureError:
+                return jsonify({'error': error_codes.token_expired}), 401
+            except jwt.DecodeError:
+                return jsonify({'error': error_codes.invalid_token}), 401
+            if data.get('type', 'access') != 'access':
+                return jsonify({'error': error_codes.invalid_token}), 401
+            cached = (data, None)
+            if 'role' not in data:
+                # Tokens issued before the role claim existed
+                curr_user = find_user(data['open_id'])
+                if not curr_user:
+                    return jsonify({'error': error_codes.no_such_user}), 401
+                cached = (data, user_snapshot(curr_user))
+            token_cache.set(token, cached, ttl=data['exp'] - time.time() if 'exp' in data else None)
+        data, snapshot = cached
+        if snapshot is not None:
+            user = db.session.merge(snapshot, load=False)
+            return fun(Principal(user.id, user.open_id, user.user_role, user), *args, **kwargs)
+        revoked_at = revoked_users.get(data['open_id'])
+        if revoked_at is not None and data['iat'] <= revoked_at:
+            return jsonify({'error': error_codes.token_expired}), 401
+        if unknown_users.get(data['open_id']) is not None:
             return jsonify({'error': error_codes.no_such_user}), 401
-        except jwt.DecodeError:
-            return jsonify({'error': error_codes.invalid_token}), 401
+        return fun(Principal(data['id'], data['open_id'], data['role']), *args, **kwargs)
 
     return decorated
 
@@ -94,9 +857,13 @@ def create_user():
         return jsonify({'error': error_codes.invalid_ssn}), 400
     if db.session.query(User.id).filter_by(ssn=ssn).scalar() is not None:
         return jsonify({'error': error_codes.user_already_exists}), 400
-    pw = generate_password_hash(pw, method='sha256')
+    try:
+        pw = hash_pool.run(generate_password_hash, pw, 'sha256')
+    except PoolFull:
+        return server_busy()
     db.session.add(User(open_id=str(uuid.uuid4()), name=name, ssn=ssn, password=pw))
     db.session.commit()
+    unknown_users.clear()
     return jsonify({'error': error_codes.no_error})
 
 
@@ -104,22 +871,61 @@ def create_user():
 def login():
     """
     Attempts to log in given value of Authentication header field
-    and is returned a token if successful.
+    and is returned a token if successful. The token is a short
+    lived access token, the refresh token is used to get a new one
+    from /token/refresh.
 
-    :return: error code and potentially token and role.
+    :return: error code and potentially token, refresh token and role.
     """
     auth = request.authorization
     if not auth or not auth.username or not auth.password:
         return jsonify({'error': error_codes.missing_header_fields}), 401
     user = User.query.filter_by(ssn=auth.username).first()
-    if not user or not check_password_hash(user.password, auth.password):
+    if not user:
         return jsonify({'error': error_codes.invalid_credentials}), 403
-    expire_time = datetime.datetime.utcnow() + datetime.timedelta(weeks=50)
-    token = jwt.encode({'open_id': user.open_id, 'exp': expire_time}, app.config['SECRET_KEY'], algorithm='HS256')
+    try:
+        if not hash_pool.run(check_password_hash, user.password, auth.password):
+            return jsonify({'error': error_codes.invalid_credentials}), 403
+    except PoolFull:
+        return server_busy()
+    token, refresh_token = issue_tokens(user)
     return jsonify(
         {
             'error': error_codes.no_error,
-            'token': token.decode('UTF-8'),
+            'token': token,
+            'refresh_token': refresh_token,
+            'role': user.user_role
+        }
+    )
+
+
+@app.route('/token/refresh', methods=['GET'])
+def refresh():
+    """
+    Issues a new access token given a valid refresh token
+    in the fenrir-refresh-token header field.
+
+    :return: error code and potentially token, refresh token and role.
+    """
+    if 'fenrir-refresh-token' not in request.headers:
+        return jsonify({'error': error_codes.missing_token}), 401
+    try:
+        data = jwt.decode(request.headers['fenrir-refresh-token'], app.config['SECRET_KEY'], algorithms='HS256')
+    except jwt.ExpiredSignatureError:
+        return jsonify({'error': error_codes.token_expired}), 401
+    except jwt.DecodeError:
+        return jsonify({'error': error_codes.invalid_token}), 401
+    if data.get('type') != 'refresh':
+        return jsonify({'error': error_codes.invalid_token}), 401
+    user = find_user(data['open_id'])
+    if not user:
+        return jsonify({'error': error_codes.no_such_user}), 401
+    token, refresh_token = issue_tokens(user)
+    return jsonify(
+        {
+            'error': error_codes.no_error,
+            'token': token,
+            'refresh_token': refresh_token,
             'role': user.user_role
         }
     )
@@ -140,8 +946,13 @@ def update_user_name(curr_user):
     name = data['name']
     if len(name) == 0:
         return jsonify({'error': error_codes.empty_data}), 400
-    curr_user.name = name
+    curr_user.user.name = name
     db.session.commit()
+    forget_user(curr_user.open_id)
+    forget_roster()
+    if curr_user.user_role != 'Client':
+        forget_series()
+        forget_staff()
     return jsonify({'error': error_codes.no_error})
 
 
@@ -164,10 +975,28 @@ def remove_user_by_id(curr_user, user_id):
         return jsonify({'error': error_codes.no_such_user}), 400
     if del_user.user_role == 'Admin':
         return jsonify({'error': error_codes.access_denied}), 403
+    open_id, staff = del_user.open_id, del_user.user_role != 'Client'
+    begin_immediate()
+    booked = [w_id for w_id, in db.session.query(participates.c.w_id).filter(participates.c.u_id == del_user.id)]
+    queued = db.session.query(waitlist.c.w_id).filter(waitlist.c.u_id == del_user.id)
+    Workout.query.filter(Workout.id.in_(booked)).update(
+        {Workout.attending: Workout.attending - 1}, synchronize_session=False)
+    Workout.query.filter(Workout.id.in_(queued.subquery())).update(
+        {Workout.waitlisted: Workout.waitlisted - 1}, synchronize_session=False)
+    db.session.execute(waitlist.delete().where(waitlist.c.u_id == del_user.id))
     del_user.workouts = []
+    for workout_id in booked:
+        promote_waitlist(workout_id)
     db.session.commit()
     db.session.delete(del_user)
     db.session.commit()
+    revoke_user(open_id)
+    unknown_users.set(open_id, True)
+    forget_schedule()
+    forget_roster()
+    if staff:
+        forget_staff()
+        forget_series()
     return jsonify({'error': error_codes.no_error})
 
 
@@ -210,6 +1039,7 @@ def admin_update_user(curr_user, user_id):
     update_user = User.query.filter_by(open_id=user_id).first()
     if not update_user:
         return jsonify({'error': error_codes.no_such_user}), 400
+    staff = update_user.user_role != 'Client'
     data = request.get_json()
     if 'expire_date' not in data and 'role' not in data:
         return jsonify({'error': error_codes.missing_data}), 400
@@ -224,43 +1054,237 @@ def admin_update_user(curr_user, user_id):
         if not valid_role(data['role']):
             return jsonify({'error': error_codes.invalid_role}), 400
         update_user.user_role = data['role']
+    open_id = update_user.open_id
+    staff = staff or update_user.user_role != 'Client'
     db.session.commit()
+    revoke_user(open_id)
+    forget_roster()
+    if staff:
+        forget_staff()
     return jsonify({'error': error_codes.no_error})
 
 
+def import_rows():
+    """
+    Reads the members sent to import_users. The body is a json
+    array of objects, json lines (application/x-ndjson) or csv
+    (text/csv) with a header line.
+
+    :return: the list of rows or None if the body can not be read
+    """
+    try:
+        if request.mimetype == 'text/csv':
+            return list(csv.DictReader(io.StringIO(request.get_data(as_text=True))))
+        if request.mimetype == 'application/x-ndjson':
+            return [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        rows = json.loads(request.get_data(as_text=True))
+    except (ValueError, csv.Error):
+        return None
+    return rows if type(rows) == list else None
+
+
+def import_error(row, valid_ssn):
+    """
+    Validates a member to import like create_user does,
+    apart from checking whether the ssn is taken.
+
+    :param row: the member
+    :param valid_ssn: whether the ssn of the member is valid
+    :return: the error code or None if the member is valid
+    """
+    if type(row) != dict or any(k not in row for k in ('name', 'password', 'ssn')):
+        return error_codes.missing_data
+    if any(type(row[k]) != str for k in ('name', 'password', 'ssn')):
+        return error_codes.invalid_data
+    if len(row['name']) == 0 or len(row['password']) == 0 or len(row['ssn']) == 0:
+        return error_codes.empty_data
+    if not valid_password(row['password']):
+        return error_codes.invalid_password
+    if not valid_ssn:
+        return error_codes.invalid_ssn
+    return None
+
+
+def taken_ssns(ssns):
+    """
+    Finds which of ssns already belong to a user, with one
+    IN query per IMPORT_CHUNK_SIZE ssns.
+
+    :param ssns: a list of ssns
+    :return: the set of the ssns that are taken
+    """
+    taken = set()
+    chunk = app.config['IMPORT_CHUNK_SIZE']
+    for start in range(0, len(ssns), chunk):
+        taken.update(ssn for ssn, in db.session.query(User.ssn).filter(User.ssn.in_(ssns[start:start + chunk])))
+    return taken
+
+
+@app.route('/admin/user/import', methods=['POST'])
+@authenticated
+def import_users(curr_user):
+    """
+    Creates many users at once, see import_rows for the formats.
+    Every member is validated before anything is written, the
+    ssns are checked with a few IN queries, the passwords are
+    hashed on the hashing threads in parallel and the users are
+    inserted IMPORT_CHUNK_SIZE at a time, one transaction each.
+    A member that is invalid or whose ssn is taken is skipped and
+    reported by its row number, counting from 1.
+
+    :param curr_user: The current session user
+    :return: error code (= 0 if none), the number of users created
+    and the error code of every member that was skipped
+    """
+    if curr_user.user_role != 'Admin':
+        return jsonify({'error': error_codes.access_denied}), 403
+    rows = import_rows()
+    if rows is None:
+        return jsonify({'error': error_codes.invalid_data}), 400
+    if len(rows) == 0:
+        return jsonify({'error': error_codes.empty_data}), 400
+    if len(rows) > app.config['MAX_IMPORT_ROWS']:
+        return jsonify({'error': error_codes.batch_too_large}), 400
+    errors, valid, seen = {}, [], set()
+    valid_ssns = is_valid_many(row.get('ssn') if type(row) == dict else None for row in rows)
+    for number, (row, valid_ssn) in enumerate(zip(rows, valid_ssns), 1):
+        error = import_error(row, valid_ssn)
+        if error is None and row['ssn'] in seen:
+            error = error_codes.user_already_exists
+        if error is not None:
+            errors[number] = error
+            continue
+        seen.add(row['ssn'])
+        valid.append((number, row))
+    taken = taken_ssns([row['ssn'] for _, row in valid])
+    for number, row in valid:
+        if row['ssn'] in taken:
+            errors[number] = error_codes.user_already_exists
+    valid = [(number, row) for number, row in valid if row['ssn'] not in taken]
+    try:
+        hashes = hash_pool.map(generate_password_hash, [(row['password'], 'sha256') for _, row in valid])
+    except PoolFull:
+        return server_busy()
+    imported, chunk = 0, app.config['IMPORT_CHUNK_SIZE']
+    for start in range(0, len(valid), chunk):
+        begin_immediate()
+        taken = taken_ssns([row['ssn'] for _, row in valid[start:start + chunk]])
+        users = []
+        for (number, row), pw in zip(valid[start:start + chunk], hashes[start:start + chunk]):
+            if row['ssn'] in taken:
+                errors[number] = error_codes.user_already_exists
+                continue
+            users.append({'open_id': str(uuid.uuid4()), 'name': row['name'], 'ssn': row['ssn'], 'password': pw})
+        if users:
+            db.session.execute(User.__table__.insert(), users)
+        db.session.commit()
+        imported += len(users)
+    unknown_users.clear()
+    return jsonify({
+        'error': error_codes.no_error,
+        'imported': imported,
+        'errors': [{'row': number, 'error': errors[number]} for number in sorted(errors)]
+    })
+
+
 @app.route('/user/all', methods=['GET'])
 @authenticated
 def get_all_users(curr_user):
     """
-    Gets the information of all of the users in the database
-    end returns a jsonobject with their information. Checks
-    if the user is a legal user and if the user has the role Admin
+    Gets the information of the users in the database one page
+    at a time, ordered by id or, with the query parameter
+    order=name, by name. The next page is fetched by sending back
+    the cursor next of the previous page. With all=true every user
+    is sent in one response, without next. The query parameter
+    fields picks the keys sent for each user. Checks if the user
+    is a legal user and if the user has the role Admin
 
     :param curr_user: The current session user
-    :return: error code (= 0 if none) and the User information
-    for all of the Users in the database
+    :return: error code (= 0 if none), the User information
+    for the Users of the page and the cursor of the next page
+    or None if it is the last
     """
     if curr_user.user_role != 'Admin':
         return jsonify({'error': error_codes.access_denied}), 403
+    fields = user_fields()
+    if fields is None:
+        return jsonify({'error': error_codes.invalid_data}), 400
+    if request.args.get('all') == 'true':
+        rows = keyset_batches(user_rows(fields), User.id)
+        return stream_json({'error': error_codes.no_error}, 'all_users', rows, partial(user_dict, fields=fields))
+    order = request.args.get('order', 'id')
+    if order not in ('id', 'name'):
+        return jsonify({'error': error_codes.invalid_data}), 400
+    columns = [User.id] if order == 'id' else [User.name, User.id]
+    rows = user_rows(fields).order_by(*columns)
+    if order == 'name' and 'name' not in fields:
+        rows = rows.add_columns(User.name)
+    if 'cursor' in request.args:
+        after = decode_cursor(request.args['cursor'])
+        if after is None or len(after) != len(columns) or type(after[-1]) != int or \
+                (order == 'name' and type(after[0]) != str):
+            return jsonify({'error': error_codes.invalid_cursor}), 400
+        rows = rows.filter(keyset_after(columns, after))
+    limit = page_size()
+    rows = rows.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].id] if order == 'id' else [rows[-1].name, rows[-1].id])
     return jsonify({
         'error': error_codes.no_error,
-        'all_users': [{
-            'name': user.name,
-            'ssn': user.ssn,
-            'open_id': user.open_id,
-            'user_role': user.user_role,
-            'start_date': user.start_date,
-            'expire_date': user.expire_date
-        } for user in User.query.all()]
+        'all_users': [user_dict(row, fields) for row in rows],
+        'next': next_cursor
     })
 
 
+@app.route('/user/search', methods=['GET'])
+@authenticated
+def search_users(curr_user):
+    """
+    Finds the users whose name, or with by=ssn whose ssn, starts
+    with the query parameter q, in order of name (or ssn). At most
+    limit users are sent. The prefix is turned into the range
+    [q, q with its last character incremented), which is served by
+    the index on the column instead of scanning the table. The
+    range is open above when q is only U+10FFFF characters. The
+    query parameter fields picks the keys sent for each user.
+    Only for Coaches and Admins.
+
+    :param curr_user: The current session user
+    :return: error code (= 0 if none) and the User information
+    of the matching users
+    """
+    if curr_user.user_role == 'Client':
+        return jsonify({'error': error_codes.access_denied}), 403
+    by = request.args.get('by', 'name')
+    fields = user_fields()
+    if by not in ('name', 'ssn') or fields is None:
+        return jsonify({'error': error_codes.invalid_data}), 400
+    prefix = request.args.get('q', '')
+    if len(prefix) == 0:
+        return jsonify({'error': error_codes.empty_data}), 400
+    column = getattr(User, by)
+    rows = user_rows(fields).filter(column >= prefix)
+    # U+10FFFF has no successor, so the bound comes from the last lower character
+    stem = prefix.rstrip(chr(sys.maxunicode))
+    if len(stem) > 0:
+        successor = ord(stem[-1]) + 1
+        if successor == 0xD800:
+            # Surrogates can not be stored, the next character is U+E000
+            successor = 0xE000
+        rows = rows.filter(column < stem[:-1] + chr(successor))
+    rows = rows.order_by(column, User.id).limit(page_size())
+    return jsonify({'error': error_codes.no_error, 'users': [user_dict(row, fields) for row in rows]})
+
+
 @app.route('/workout', methods=['POST'])
 @authenticated
 def create_workout(curr_user):
     """
     Allows admins and coaches to create a workout at a specific time
     with a specific descritpion and that workout is assigned to a coach
+    The capacity of the workout is optional and defaults to WORKOUT_CAPACITY
 
     :param curr_user:
     :return: error code (= 0 if none)
@@ -284,20 +1308,127 @@ def create_workout(curr_user):
     if 'time' in data:
         if len(data['time']) == 0:
             return jsonify({'error': error_codes.empty_data}), 400
+    capacity = data.get('capacity', app.config['WORKOUT_CAPACITY'])
+    if not valid_capacity(capacity):
+        return jsonify({'error': error_codes.invalid_capacity}), 400
     the_date = datetime.datetime(
         *tuple(map(int, list(reversed(data['date'].split('/'))) + data['time'].split(':'))))
     if Workout.query.filter_by(date_time=the_date).first() is not None:
         return jsonify({'error': error_codes.workout_already_exists}), 400
+    if series_class_at(the_date):
+        return jsonify({'error': error_codes.workout_already_exists}), 400
     the_coach = User.query.filter_by(open_id=coach_id).first()
+    if the_coach is None:
+        return jsonify({'error': error_codes.no_such_user}), 400
     if the_coach.user_role != 'Coach':
         if the_coach.user_role != 'Admin':
             return jsonify({'error': error_codes.access_denied}), 403
-    db.session.add(Workout(coach_id=coach_id, date_time=datetime.datetime(
-        *tuple(map(int, list(reversed(data['date'].split('/'))) + data['time'].split(':')))), description=desc))
+    db.session.add(Workout(coach_id=the_coach.id, date_time=the_date, description=desc, capacity=capacity))
     db.session.commit()
+    forget_schedule(the_date)
     return jsonify({'error': error_codes.no_error})
 
 
+def template_classes(classes):
+    """
+    Validates the classes of a weekly timetable sent to
+    create_workouts_from_template.
+
+    :param classes: the list of classes
+    :return: the error code and the list of
+    (weekday, time, coach open_id, description, capacity),
+    where the list is None if there is an error
+    """
+    if type(classes) != list or len(classes) == 0:
+        return error_codes.missing_data, None
+    if len(classes) > app.config['MAX_TEMPLATE_CLASSES']:
+        return error_codes.batch_too_large, None
+    parsed = []
+    for entry in classes:
+        if type(entry) != dict or any(k not in entry for k in ('weekday', 'time', 'coach_id', 'description')):
+            return error_codes.missing_data, None
+        if any(type(entry[k]) != str for k in ('time', 'coach_id', 'description')):
+            return error_codes.invalid_data, None
+        if len(entry['coach_id']) == 0 or len(entry['description']) == 0 or len(entry['time']) == 0:
+            return error_codes.empty_data, None
+        capacity = entry.get('capacity', app.config['WORKOUT_CAPACITY'])
+        if not valid_capacity(capacity):
+            return error_codes.invalid_capacity, None
+        try:
+            time_of_day = datetime.time(*map(int, entry['time'].split(':')))
+        except (TypeError, ValueError):
+            return error_codes.invalid_date_time, None
+        if type(entry['weekday']) != int or entry['weekday'] not in range(7):
+            return error_codes.invalid_date_time, None
+        parsed.append((entry['weekday'], time_of_day, entry['coach_id'], entry['description'], capacity))
+    return error_codes.no_error, parsed
+
+
+@app.route('/workout/template', methods=['POST'])
+@authenticated
+def create_workouts_from_template(curr_user):
+    """
+    Allows admins and coaches to create every occurrence of a weekly
+    timetable from the date 'from' up to and including the date 'to',
+    both structured like '2001-09-11'. Every class of the timetable
+    has a weekday (0 is Monday), a time like '07:00', a coach_id and
+    a description and optionally a capacity. The coaches are looked
+    up with one query, the existing workouts in the range with one
+    more and the new workouts are inserted in one transaction.
+    An occurrence at a time that already has a workout, or a class
+    of a workout series, is skipped and reported in conflicts.
+
+    :param curr_user: The current session user
+    :return: error code (= 0 if none), the number of workouts created
+    and the date_time and class index of every conflict
+    """
+    if curr_user.user_role == 'Client':
+        return jsonify({'error': error_codes.access_denied}), 403
+    data = request.get_json()
+    if any(k not in data for k in ('from', 'to', 'classes')):
+        return jsonify({'error': error_codes.missing_data}), 400
+    if type(data['from']) != str or type(data['to']) != str:
+        return jsonify({'error': error_codes.invalid_date_time}), 400
+    first_day, last_day = parse_day(data['from']), parse_day(data['to'])
+    if first_day is None or last_day is None:
+        return jsonify({'error': error_codes.invalid_date_time}), 400
+    days = (last_day - first_day).days + 1
+    if days < 1 or days > app.config['MAX_TEMPLATE_SPAN_DAYS']:
+        return jsonify({'error': error_codes.invalid_date_range}), 400
+    error, classes = template_classes(data['classes'])
+    if classes is None:
+        return jsonify({'error': error}), 400
+    coaches = dict(db.session.query(User.open_id, User).filter(
+        User.open_id.in_({coach_id for _, _, coach_id, _, _ in classes})))
+    for _, _, coach_id, _, _ in classes:
+        if coach_id not in coaches:
+            return jsonify({'error': error_codes.no_such_user}), 400
+        if coaches[coach_id].user_role not in ('Coach', 'Admin'):
+            return jsonify({'error': error_codes.access_denied}), 403
+    end = last_day + datetime.timedelta(days=1)
+    begin_immediate()
+    taken = {date_time for date_time, in db.session.query(Workout.date_time).filter(
+        Workout.date_time >= first_day, Workout.date_time < end)}
+    taken.update(date_time for _, date_time in series_occurrences(first_day, end))
+    workouts, conflicts = [], []
+    for day in (first_day + datetime.timedelta(days=i) for i in range(days)):
+        for index, (weekday, time_of_day, coach_id, description, capacity) in enumerate(classes):
+            if weekday != day.weekday():
+                continue
+            date_time = datetime.datetime.combine(day.date(), time_of_day)
+            if date_time in taken:
+                conflicts.append({'date_time': date_time, 'class': index})
+                continue
+            taken.add(date_time)
+            workouts.append({'coach_id': coaches[coach_id].id, 'date_time': date_time,
+                             'description': description, 'capacity': capacity})
+    if workouts:
+        db.session.execute(Workout.__table__.insert(), workouts)
+    db.session.commit()
+    forget_schedule()
+    return jsonify({'error': error_codes.no_error, 'created': len(workouts), 'conflicts': conflicts})
+
+
 @app.route('/user/coaches', methods=['GET'])
 @authenticated
 def get_all_none_clientss(curr_user):
@@ -306,6 +1437,7 @@ def get_all_none_clientss(curr_user):
     end returns a jsonobject with their information. Checks
     if the user is a legal user and if the user has the role Admin
     Admins are also considered to coaches as per request of our client(Fenrir)
+    The query parameter fields picks the keys sent for each user.
 
     :param curr_user: The current session user
     :return: error code (= 0 if none) and the User information
@@ -313,17 +1445,18 @@ def get_all_none_clientss(curr_user):
     """
     if curr_user.user_role == 'Client':
         return jsonify({'error': error_codes.access_denied}), 403
+    fields = user_fields()
+    if fields is None:
+        return jsonify({'error': error_codes.invalid_data}), 400
+    staff = staff_cache.get('staff')
+    if staff is None:
+        staff = [user_dict(row) for row in user_rows().filter(User.user_role != 'Client').order_by(User.id)]
+        staff_cache.set('staff', staff)
+    if fields != USER_FIELDS:
+        staff = [{field: user[field] for field in fields} for user in staff]
     return jsonify({
         'error': error_codes.no_error,
-        'all_users': [{
-            'name': user.name,
-            'ssn': user.ssn,
-            'open_id': user.open_id,
-            'user_role': user.user_role,
-            'start_date': user.start_date,
-            'expire_date': user.expire_date
-        } for user in User.query.all()
-            if user.user_role != 'Client']
+        'all_users': staff
     })
 
 
@@ -342,12 +1475,13 @@ def get_workout(curr_user, workout_date_time):
         *tuple(map(int, list((workout_date_time.split('-'))))))).first()
     if workout_got is None:
         return jsonify({'error': error_codes.invalid_date_time}), 400
+    coach = workout_got.coach
     return jsonify(
         {
             'error': error_codes.no_error,
             'workout': {
                 'id': workout_got.id,
-                'coach_id': workout_got.coach_id,
+                'coach_id': None if coach is None else coach.open_id,
                 'description': workout_got.description,
                 'date_time': workout_got.date_time
             }
@@ -366,22 +1500,47 @@ def get_workouts_by_date(curr_user, workout_date_time):
     :return: error code (= 0 if none) and the Workout information
     of the workouts at the date that was sent in
     """
-    all_work = Workout.query.all()
-    lis = []
-    for workout in all_work:
-        if workout.date_time.date() == datetime.datetime(
-                *tuple(map(int, list((workout_date_time.split('-')))))).date():
-            dictionary = {}
-            the_coach = User.query.filter_by(open_id=workout.coach_id).first()
-            dictionary['id'] = workout.id
-            dictionary['coach_name'] = the_coach.name
-            dictionary['coach_id'] = workout.coach_id
-            dictionary['description'] = workout.description
-            dictionary['date_time'] = workout.date_time
-            dictionary['attending'] = db.session.query(Workout).join(Workout.users).filter(
-                Workout.id == workout.id).count()
-            lis.append(dictionary)
-    return jsonify({'error': error_codes.no_error, 'all_workouts': lis})
+    day_start = parse_day(workout_date_time)
+    if day_start is None:
+        return jsonify({'error': error_codes.invalid_date_time}), 400
+    tag = version_tag(schedule_versions, day_start.date())
+    response = not_modified(tag)
+    if response is not None:
+        return response
+    body = schedule_cache.get(tag)
+    if body is None:
+        workouts = schedule(day_start, day_start + datetime.timedelta(days=1))
+        body = jsonify({'error': error_codes.no_error, 'all_workouts': workouts}).get_data()
+        schedule_cache.set(tag, body)
+    return with_etag(app.response_class(body, mimetype=app.config['JSONIFY_MIMETYPE']), tag)
+
+
+@app.route('/workout/range/<from_date>/<to_date>', methods=['GET'])
+@authenticated
+def get_workouts_by_range(curr_user, from_date, to_date):
+    """
+    Takes in two dates structured like for example '2001-09-11'
+    and sends the workouts of every day from from_date up to and
+    including to_date, grouped by day. The window can be at most
+    MAX_SCHEDULE_SPAN_DAYS days long.
+    :param curr_user:
+    :param from_date:
+    :param to_date:
+    :return: error code (= 0 if none) and for every day in the
+    window the Workout information as sent by get_workouts_by_date
+    """
+    first_day, last_day = parse_day(from_date), parse_day(to_date)
+    if first_day is None or last_day is None:
+        return jsonify({'error': error_codes.invalid_date_time}), 400
+    days = (last_day - first_day).days + 1
+    if days < 1 or days > app.config['MAX_SCHEDULE_SPAN_DAYS']:
+        return jsonify({'error': error_codes.invalid_date_range}), 400
+    all_workouts = {
+        (first_day + datetime.timedelta(days=i)).strftime('%Y-%m-%d'): [] for i in range(days)
+    }
+    for workout in schedule(first_day, last_day + datetime.timedelta(days=1)):
+        all_workouts[workout['date_time'].strftime('%Y-%m-%d')].append(workout)
+    return jsonify({'error': error_codes.no_error, 'all_workouts': all_workouts})
 
 
 @app.route('/workout/<int:workout_id>', methods=['GET'])
@@ -391,27 +1550,161 @@ def participate_in_workout(curr_user, workout_id):
     Adds the curr_user to the list of participants in the workout
     that has the id that is passed as the paramter workout_id. If the user
     is already participating it removes the connection between the user and the workout
+    and the first user on the waitlist takes the place.
+    The decision and the change of Workout.attending happen in one
+    transaction that holds the write lock, so a workout is never overbooked.
     :param curr_user:
     :param workout_id:
     :return: error code (= 0 if none) if the workout does not exist
     then it sends an appropriate error code
     """
+    return toggle_participation(curr_user, workout_id)
 
-    work = Workout.query.filter_by(id=workout_id).first()
-    if work is None:
+
+def toggle_participation(curr_user, workout_id):
+    """
+    Books or cancels the place of curr_user in a workout, see
+    participate_in_workout.
+
+    :param curr_user: The current session user
+    :param workout_id: the id of the workout
+    :return: the response of participate_in_workout
+    """
+    begin_immediate()
+    day = db.session.query(Workout.date_time).filter_by(id=workout_id).scalar()
+    if day is None:
+        db.session.rollback()
         return jsonify({'error': error_codes.no_such_workout}), 400
-    x = User.query.join(Workout.users).filter(Workout.id == workout_id).filter(User.id == curr_user.id).first()
-    if db.session.query(Workout).join(Workout.users).filter(
-                    Workout.id == work.id).count() > 11:
-        return jsonify({'error': error_codes.workout_is_full}), 400
-    if x is not None:
-        curr_user.workouts.remove(work)
-        db.session.commit()
-        return jsonify({'error': error_codes.no_error, 'message': 'removed'})
+    booked = db.and_(participates.c.u_id == curr_user.id, participates.c.w_id == workout_id)
+    if db.session.execute(participates.delete().where(booked)).rowcount:
+        Workout.query.filter_by(id=workout_id).update(
+            {Workout.attending: Workout.attending - 1}, synchronize_session=False)
+        promote_waitlist(workout_id)
+        message = 'removed'
     else:
-        curr_user.workouts.append(work)
+        has_room = Workout.query.filter(Workout.id == workout_id, Workout.attending < Workout.capacity)
+        if not has_room.update({Workout.attending: Workout.attending + 1}, synchronize_session=False):
+            db.session.rollback()
+            return jsonify({'error': error_codes.workout_is_full}), 400
+        db.session.execute(participates.insert().values(u_id=curr_user.id, w_id=workout_id))
+        message = 'attended'
+    db.session.commit()
+    forget_schedule(day)
+    forget_roster(workout_id)
+    return jsonify({'error': error_codes.no_error, 'message': message})
+
+
+def booking_entry(entry):
+    """
+    Validates an element of the workout_ids of book_workouts: the id
+    of a workout, or an object with the series_id and the day, like
+    '2001-09-11', of an occurrence of a series.
+
+    :param entry: the element
+    :return: the workout id, a tuple of the series id and the start
+    of the day, or None if the element is not valid
+    """
+    if type(entry) == int:
+        return entry
+    if type(entry) != dict or set(entry) != {'series_id', 'day'}:
+        return None
+    if type(entry['series_id']) != int or type(entry['day']) != str:
+        return None
+    day = parse_day(entry['day'])
+    return None if day is None else (entry['series_id'], day)
+
+
+@app.route('/workout/book', methods=['POST'])
+@authenticated
+def book_workouts(curr_user):
+    """
+    Adds the curr_user to the participants of every workout in the
+    list workout_ids, as far as each has room, and commits once.
+    Workouts the user already participates in are left as they are.
+    An occurrence of a series, given as {series_id, day}, is made a
+    Workout in the same transaction, as participate_in_series does.
+    :param curr_user:
+    :return: error code (= 0 if none) and for every element the id of
+    the workout and the result 'attended', 'full' or 'missing'
+    """
+    data = request.get_json()
+    if 'workout_ids' not in data:
+        return jsonify({'error': error_codes.missing_data}), 400
+    workout_ids = data['workout_ids']
+    if type(workout_ids) != list or len(workout_ids) == 0:
+        return jsonify({'error': error_codes.empty_data}), 400
+    if len(workout_ids) > app.config['MAX_BATCH_BOOKINGS']:
+        return jsonify({'error': error_codes.batch_too_large}), 400
+    entries = [booking_entry(entry) for entry in workout_ids]
+    if any(entry is None for entry in entries):
+        return jsonify({'error': error_codes.invalid_data}), 400
+    begin_immediate()
+    ids = [entry if type(entry) == int else materialize(*entry)[1] for entry in entries]
+    days = dict(db.session.query(Workout.id, Workout.date_time).filter(Workout.id.in_(ids)))
+    booked = {w_id for w_id, in db.session.query(participates.c.w_id).filter(
+        participates.c.u_id == curr_user.id, participates.c.w_id.in_(ids))}
+    results, attended = [], []
+    for entry, workout_id in zip(workout_ids, ids):
+        result = {'id': workout_id} if type(entry) == int else dict(entry, id=workout_id)
+        results.append(result)
+        if workout_id not in days:
+            result['result'] = 'missing'
+            continue
+        if workout_id not in booked:
+            has_room = Workout.query.filter(Workout.id == workout_id, Workout.attending < Workout.capacity)
+            if not has_room.update({Workout.attending: Workout.attending + 1}, synchronize_session=False):
+                result['result'] = 'full'
+                continue
+            booked.add(workout_id)
+            attended.append({'u_id': curr_user.id, 'w_id': workout_id})
+        result['result'] = 'attended'
+    if attended:
+        db.session.execute(participates.insert(), attended)
+    db.session.commit()
+    for booking in attended:
+        forget_schedule(days[booking['w_id']])
+        forget_roster(booking['w_id'])
+    return jsonify({'error': error_codes.no_error, 'results': results})
+
+
+@app.route('/workout/waitlist/<int:workout_id>', methods=['GET'])
+@authenticated
+def waitlist_for_workout(curr_user, workout_id):
+    """
+    Puts the curr_user at the end of the waitlist of a full workout,
+    or takes them off it if they are already waiting. Users on the
+    waitlist become participants in order as places free up.
+    :param curr_user:
+    :param workout_id:
+    :return: error code (= 0 if none) and the place of the user in
+    the waitlist if they were added to it
+    """
+    begin_immediate()
+    day = db.session.query(Workout.date_time).filter_by(id=workout_id).scalar()
+    if day is None:
+        db.session.rollback()
+        return jsonify({'error': error_codes.no_such_workout}), 400
+    waiting = db.and_(waitlist.c.w_id == workout_id, waitlist.c.u_id == curr_user.id)
+    if db.session.execute(waitlist.delete().where(waiting)).rowcount:
+        Workout.query.filter_by(id=workout_id).update(
+            {Workout.waitlisted: Workout.waitlisted - 1}, synchronize_session=False)
         db.session.commit()
-        return jsonify({'error': error_codes.no_error, 'message': 'attended'})
+        forget_schedule(day)
+        return jsonify({'error': error_codes.no_error, 'message': 'removed'})
+    booked = db.and_(participates.c.w_id == workout_id, participates.c.u_id == curr_user.id)
+    if db.session.query(participates).filter(booked).first() is not None:
+        db.session.rollback()
+        return jsonify({'error': error_codes.already_participating}), 400
+    is_full = Workout.query.filter(Workout.id == workout_id, Workout.attending >= Workout.capacity)
+    if not is_full.update({Workout.waitlisted: Workout.waitlisted + 1}, synchronize_session=False):
+        db.session.rollback()
+        return jsonify({'error': error_codes.workout_not_full}), 400
+    last = db.session.query(db.func.max(waitlist.c.position)).filter(waitlist.c.w_id == workout_id).scalar()
+    db.session.execute(waitlist.insert().values(w_id=workout_id, position=(last or 0) + 1, u_id=curr_user.id))
+    position = db.session.query(Workout.waitlisted).filter_by(id=workout_id).scalar()
+    db.session.commit()
+    forget_schedule(day)
+    return jsonify({'error': error_codes.no_error, 'message': 'waitlisted', 'position': position})
 
 
 @app.route('/admin/workout/update/<workout_id>', methods=['PUT'])
@@ -428,17 +1721,26 @@ def admin_update_workout(curr_user, workout_id):
     update_workout = Workout.query.filter_by(id=workout_id).first()
     if not update_workout:
         return jsonify({'error': error_codes.no_such_workout}), 400
+    old_day = update_workout.date_time
     data = request.get_json()
-    if 'coach_id' not in data and 'description' not in data and 'date' not in data and 'time' not in data:
+    if 'coach_id' not in data and 'description' not in data and 'date' not in data and 'time' not in data \
+            and 'capacity' not in data:
         return jsonify({'error': error_codes.missing_data}), 400
     if 'coach_id' in data:
         if len(data['coach_id']) == 0:
             return jsonify({'error': error_codes.empty_data}), 400
-        update_workout.coach_id = data['coach_id']
+        the_coach = User.query.filter_by(open_id=data['coach_id']).first()
+        if the_coach is None:
+            return jsonify({'error': error_codes.no_such_user}), 400
+        update_workout.coach_id = the_coach.id
     if 'description' in data:
         if len(data['description']) == 0:
             return jsonify({'error': error_codes.empty_data}), 400
         update_workout.description = data['description']
+    if 'capacity' in data:
+        if not valid_capacity(data['capacity']):
+            return jsonify({'error': error_codes.invalid_capacity}), 400
+        update_workout.capacity = data['capacity']
     if 'date' in data and 'time' in data:
         if len(data['date']) == 0 or len(data['time']) == 0:
             return jsonify({'error': error_codes.empty_data}), 400
@@ -456,7 +1758,344 @@ def admin_update_workout(curr_user, workout_id):
         old_date = update_workout.date_time.strftime('%Y/%m/%d')
         update_workout.date_time = datetime.datetime(*tuple(map(int, list(
             old_date.split('/')) + data['time'].split(':'))))
+    new_day = update_workout.date_time
+    if new_day != old_day and series_class_at(new_day):
+        db.session.rollback()
+        return jsonify({'error': error_codes.workout_already_exists}), 400
+    if 'capacity' in data:
+        begin_immediate()
+        promote_waitlist(update_workout.id)
     db.session.commit()
+    forget_roster(update_workout.id)
+    forget_schedule(old_day)
+    forget_schedule(new_day)
+    return jsonify({'error': error_codes.no_error})
+
+
+def materialize(series_id, day):
+    """
+    Makes the occurrence of a series on day a Workout, so it can be
+    booked or edited like any other. The Workout is recorded as an
+    exception of the series, so the occurrence is not expanded again.
+    Starts the transaction with begin_immediate and leaves it open.
+
+    :param series_id: the id of the WorkoutSeries
+    :param day: the start of the day of the occurrence
+    :return: the error code and the id of the Workout,
+    which is None if there is an error
+    """
+    begin_immediate()
+    series = db.session.query(WorkoutSeries).filter_by(id=series_id).first()
+    if series is None:
+        return error_codes.no_such_workout, None
+    date_time = datetime.datetime.combine(day.date(), series.time)
+    if date_time not in occurrences(series, day, day + datetime.timedelta(days=1)):
+        return error_codes.no_such_workout, None
+    exception = db.session.query(series_exceptions.c.workout_id).filter(
+        series_exceptions.c.series_id == series_id, series_exceptions.c.day == day).first()
+    if exception is not None:
+        if exception.workout_id is None:
+            return error_codes.no_such_workout, None
+        return error_codes.no_error, exception.workout_id
+    if db.session.query(Workout.id).filter_by(date_time=date_time).scalar() is not None:
+        return error_codes.workout_already_exists, None
+    workout = Workout(coach_id=series.coach_id, date_time=date_time, description=series.description,
+                      capacity=series.capacity, series_id=series.id)
+    db.session.add(workout)
+    db.session.flush()
+    db.session.execute(series_exceptions.insert().values(series_id=series.id, day=day, workout_id=workout.id))
+    return error_codes.no_error, workout.id
+
+
+def series_conflict(weekday, time_of_day, starts, ends, series_id=None):
+    """
+    Checks whether another series has a class at the same weekday
+    and time while the given one runs.
+
+    :param weekday: the weekday of the series, 0 is Monday
+    :param time_of_day: the time of the series
+    :param starts: the first day of the series
+    :param ends: the day the series ends or None
+    :param series_id: the id of the series itself, if it exists
+    :return: True iff there is such a series
+    """
+    other = db.session.query(WorkoutSeries.id).filter(
+        WorkoutSeries.weekday == weekday,
+        WorkoutSeries.time == time_of_day,
+        WorkoutSeries.id != series_id,
+        db.or_(WorkoutSeries.ends.is_(None), WorkoutSeries.ends > starts)
+    )
+    if ends is not None:
+        other = other.filter(WorkoutSeries.starts < ends)
+    return other.first() is not None
+
+
+def workout_conflict(weekday, time_of_day, starts, ends, series_id=None):
+    """
+    Checks whether a workout that is not an occurrence of the given
+    series is at a time the series would have a class, which the
+    workout would hide. Days with an exception of the series do not
+    count, since the series has no class of its own there.
+
+    :param weekday: the weekday of the series, 0 is Monday
+    :param time_of_day: the time of the series
+    :param starts: the first day of the series
+    :param ends: the day the series ends or None
+    :param series_id: the id of the series itself, if it exists
+    :return: True iff there is such a workout
+    """
+    other = db.session.query(Workout.id).filter(
+        # strftime counts the weekdays from Sunday
+        db.func.strftime('%w %H:%M:%S', Workout.date_time) == '{0} {1}'.format(
+            (weekday + 1) % 7, time_of_day.strftime('%H:%M:%S')),
+        Workout.date_time >= starts
+    )
+    if ends is not None:
+        other = other.filter(Workout.date_time < ends)
+    if series_id is not None:
+        days = db.session.query(db.func.date(series_exceptions.c.day)).filter(
+            series_exceptions.c.series_id == series_id)
+        other = other.filter(db.func.date(Workout.date_time).notin_(days.subquery()))
+    return other.first() is not None
+
+
+def series_coach(coach_id):
+    """
+    Finds the coach of a series the way create_workout does.
+
+    :param coach_id: the open_id of the coach
+    :return: the error code, the http status and the User,
+    which is None if there is an error
+    """
+    the_coach = User.query.filter_by(open_id=coach_id).first()
+    if the_coach is None:
+        return error_codes.no_such_user, 400, None
+    if the_coach.user_role not in ('Coach', 'Admin'):
+        return error_codes.access_denied, 403, None
+    return error_codes.no_error, 200, the_coach
+
+
+@app.route('/workout/series', methods=['POST'])
+@authenticated
+def create_workout_series(curr_user):
+    """
+    Allows admins and coaches to create a workout that repeats every
+    week on a weekday (0 is Monday) at a time like '07:00', from the
+    date 'from' and, if 'to' is given, up to and including the date
+    'to', both structured like '2001-09-11'. The coach_id and the
+    description are required and the capacity is optional, as in
+    create_workout. No Workout is created; the schedule endpoints
+    expand the series for the days they send and an occurrence only
+    becomes a Workout when it is first booked or edited. A series
+    with a class at the time of another series or of a workout is
+    rejected.
+
+    :param curr_user: The current session user
+    :return: error code (= 0 if none) and the id of the series
+    """
+    if curr_user.user_role == 'Client':
+        return jsonify({'error': error_codes.access_denied}), 403
+    data = request.get_json()
+    if 'from' not in data:
+        return jsonify({'error': error_codes.missing_data}), 400
+    error, classes = template_classes([data])
+    if classes is None:
+        return jsonify({'error': error}), 400
+    weekday, time_of_day, coach_id, description, capacity = classes[0]
+    if any(type(data[k]) != str for k in ('from', 'to') if k in data):
+        return jsonify({'error': error_codes.invalid_date_time}), 400
+    starts = parse_day(data['from'])
+    ends = parse_day(data['to']) if 'to' in data else None
+    if starts is None or ('to' in data and ends is None):
+        return jsonify({'error': error_codes.invalid_date_time}), 400
+    if ends is not None:
+        ends += datetime.timedelta(days=1)
+        if ends <= starts:
+            return jsonify({'error': error_codes.invalid_date_range}), 400
+    error, status, the_coach = series_coach(coach_id)
+    if the_coach is None:
+        return jsonify({'error': error}), status
+    if series_conflict(weekday, time_of_day, starts, ends) or workout_conflict(weekday, time_of_day, starts, ends):
+        return jsonify({'error': error_codes.workout_already_exists}), 400
+    series = WorkoutSeries(coach_id=the_coach.id, weekday=weekday, time=time_of_day, description=description,
+                           capacity=capacity, starts=starts, ends=ends)
+    db.session.add(series)
+    db.session.commit()
+    series_id = series.id
+    forget_series()
+    return jsonify({'error': error_codes.no_error, 'series_id': series_id})
+
+
+@app.route('/workout/series/<int:series_id>/<day>', methods=['GET'])
+@authenticated
+def participate_in_series(curr_user, series_id, day):
+    """
+    Like participate_in_workout for the occurrence of a series on
+    day, structured like '2001-09-11'. The first booking makes the
+    occurrence a Workout, in the same transaction as the booking.
+
+    :param curr_user: The current session user
+    :param series_id: the id of the series
+    :param day: the day of the occurrence
+    :return: error code (= 0 if none) and the message of
+    participate_in_workout
+    """
+    day_start = parse_day(day)
+    if day_start is None:
+        return jsonify({'error': error_codes.invalid_date_time}), 400
+    error, workout_id = materialize(series_id, day_start)
+    if workout_id is None:
+        db.session.rollback()
+        return jsonify({'error': error}), 400
+    return toggle_participation(curr_user, workout_id)
+
+
+@app.route('/admin/workout/series/<int:series_id>/<day>', methods=['POST'])
+@authenticated
+def materialize_series_workout(curr_user, series_id, day):
+    """
+    Makes the occurrence of a series on day, structured like
+    '2001-09-11', a Workout so that it can be changed on its own
+    with admin_update_workout. Does nothing if it already is one.
+
+    :param curr_user: The current session user
+    :param series_id: the id of the series
+    :param day: the day of the occurrence
+    :return: error code (= 0 if none) and the id of the Workout
+    """
+    if curr_user.user_role == 'Client':
+        return jsonify({'error': error_codes.access_denied}), 403
+    day_start = parse_day(day)
+    if day_start is None:
+        return jsonify({'error': error_codes.invalid_date_time}), 400
+    error, workout_id = materialize(series_id, day_start)
+    if workout_id is None:
+        db.session.rollback()
+        return jsonify({'error': error}), 400
+    db.session.commit()
+    forget_schedule(day_start)
+    return jsonify({'error': error_codes.no_error, 'workout_id': workout_id})
+
+
+@app.route('/admin/workout/series/<int:series_id>/<day>', methods=['DELETE'])
+@authenticated
+def cancel_series_workout(curr_user, series_id, day):
+    """
+    Cancels the occurrence of a series on day, structured like
+    '2001-09-11'. An occurrence that already is a Workout can not
+    be cancelled here.
+
+    :param curr_user: The current session user
+    :param series_id: the id of the series
+    :param day: the day of the occurrence
+    :return: error code (= 0 if none)
+    """
+    if curr_user.user_role == 'Client':
+        return jsonify({'error': error_codes.access_denied}), 403
+    day_start = parse_day(day)
+    if day_start is None:
+        return jsonify({'error': error_codes.invalid_date_time}), 400
+    series = db.session.query(WorkoutSeries).filter_by(id=series_id).first()
+    if series is None or not any(occurrences(series, day_start, day_start + datetime.timedelta(days=1))):
+        return jsonify({'error': error_codes.no_such_workout}), 400
+    begin_immediate()
+    exception = db.session.query(series_exceptions.c.workout_id).filter(
+        series_exceptions.c.series_id == series_id, series_exceptions.c.day == day_start).first()
+    if exception is not None and exception.workout_id is not None:
+        db.session.rollback()
+        return jsonify({'error': error_codes.workout_already_exists}), 400
+    if exception is None:
+        db.session.execute(series_exceptions.insert().values(series_id=series_id, day=day_start))
+    db.session.commit()
+    forget_schedule(day_start)
+    return jsonify({'error': error_codes.no_error})
+
+
+@app.route('/admin/workout/series/<int:series_id>', methods=['PUT'])
+@authenticated
+def admin_update_workout_series(curr_user, series_id):
+    """
+    Changes every occurrence of a series that is not yet a Workout
+    with one update: any of coach_id, description, capacity, time
+    like '07:00' and the last day 'to' like '2001-09-11'. Occurrences
+    that already are Workouts are changed with admin_update_workout.
+
+    :param curr_user: The current session user
+    :param series_id: the id of the series
+    :return: error code (= 0 if none)
+    """
+    if curr_user.user_role == 'Client':
+        return jsonify({'error': error_codes.access_denied}), 403
+    series = db.session.query(WorkoutSeries).filter_by(id=series_id).first()
+    if series is None:
+        return jsonify({'error': error_codes.no_such_workout}), 400
+    data = request.get_json()
+    if all(k not in data for k in ('coach_id', 'description', 'capacity', 'time', 'to')):
+        return jsonify({'error': error_codes.missing_data}), 400
+    if any(type(data[k]) != str for k in ('coach_id', 'description', 'time', 'to') if k in data):
+        return jsonify({'error': error_codes.invalid_data}), 400
+    if any(len(data[k]) == 0 for k in ('coach_id', 'description', 'time', 'to') if k in data):
+        return jsonify({'error': error_codes.empty_data}), 400
+    if 'coach_id' in data:
+        error, status, the_coach = series_coach(data['coach_id'])
+        if the_coach is None:
+            return jsonify({'error': error}), status
+        series.coach_id = the_coach.id
+    if 'description' in data:
+        series.description = data['description']
+    if 'capacity' in data:
+        if not valid_capacity(data['capacity']):
+            return jsonify({'error': error_codes.invalid_capacity}), 400
+        series.capacity = data['capacity']
+    if 'time' in data:
+        try:
+            series.time = datetime.time(*map(int, data['time'].split(':')))
+        except (TypeError, ValueError):
+            return jsonify({'error': error_codes.invalid_date_time}), 400
+    if 'to' in data:
+        last_day = parse_day(data['to'])
+        if last_day is None:
+            return jsonify({'error': error_codes.invalid_date_time}), 400
+        if last_day < series.starts:
+            return jsonify({'error': error_codes.invalid_date_range}), 400
+        series.ends = last_day + datetime.timedelta(days=1)
+    if series_conflict(series.weekday, series.time, series.starts, series.ends, series.id) \
+            or workout_conflict(series.weekday, series.time, series.starts, series.ends, series.id):
+        db.session.rollback()
+        return jsonify({'error': error_codes.workout_already_exists}), 400
+    db.session.commit()
+    forget_series()
+    return jsonify({'error': error_codes.no_error})
+
+
+@app.route('/admin/workout/series/<int:series_id>', methods=['DELETE'])
+@authenticated
+def cancel_workout_series(curr_user, series_id):
+    """
+    Ends a series so it has no occurrences from the day 'from',
+    structured like '2001-09-11' and given in the query string,
+    or from today if it is not. Occurrences that already are
+    Workouts are kept.
+
+    :param curr_user: The current session user
+    :param series_id: the id of the series
+    :return: error code (= 0 if none)
+    """
+    if curr_user.user_role == 'Client':
+        return jsonify({'error': error_codes.access_denied}), 403
+    series = db.session.query(WorkoutSeries).filter_by(id=series_id).first()
+    if series is None:
+        return jsonify({'error': error_codes.no_such_workout}), 400
+    if 'from' in request.args:
+        ends = parse_day(request.args['from'])
+        if ends is None:
+            return jsonify({'error': error_codes.invalid_date_time}), 400
+    else:
+        ends = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    if series.ends is None or ends < series.ends:
+        series.ends = max(ends, series.starts)
+    db.session.commit()
+    forget_series()
     return jsonify({'error': error_codes.no_error})
 
 
@@ -474,51 +2113,137 @@ def get_coach_workouts_by_date(curr_user, workout_date_time):
     """
     if curr_user.user_role == 'Client':
         return jsonify({'error': error_codes.access_denied}), 403
-    all_work = Workout.query.all()
-    lis = []
-    for workout in all_work:
-        if workout.date_time.date() == datetime.datetime(
-                *tuple(map(int, list((workout_date_time.split('-')))))).date() and curr_user.open_id == workout.coach_id:
-            dictionary = {}
-            the_coach = User.query.filter_by(open_id=workout.coach_id).first()
-            dictionary['id'] = workout.id
-            dictionary['coach_name'] = the_coach.name
-            dictionary['coach_id'] = workout.coach_id
-            dictionary['description'] = workout.description
-            dictionary['date_time'] = workout.date_time
-            dictionary['attending'] = db.session.query(Workout).join(Workout.users).filter(
-                Workout.id == workout.id).count()
-            lis.append(dictionary)
-    return jsonify({'error': error_codes.no_error, 'all_workouts': lis})
+    day_start = parse_day(workout_date_time)
+    if day_start is None:
+        return jsonify({'error': error_codes.invalid_date_time}), 400
+    tag = '{0}-{1}'.format(version_tag(schedule_versions, day_start.date()), curr_user.id)
+    response = not_modified(tag)
+    if response is not None:
+        return response
+    workouts = schedule(day_start, day_start + datetime.timedelta(days=1), curr_user.id)
+    return with_etag(jsonify({'error': error_codes.no_error, 'all_workouts': workouts}), tag)
 
 
 @app.route('/workout/users/<workout_id>', methods=['GET'])
 @authenticated
 def get_workout_participants(curr_user, workout_id):
     """
+    Gets the users participating in a workout, with an ETag.
 
     :param curr_user:
     :param workout_id:
-    :return: error code (= 0 if none) and the Workout information
-    of the workouts at the date that was sent in
+    :return: error code (= 0 if none) and the User information
+    of the participants of the workout
     """
+    if curr_user.user_role == 'Client':
+        return jsonify({'error': error_codes.access_denied}), 403
+    try:
+        workout_id = int(workout_id)
+    except ValueError:
+        return jsonify({'error': error_codes.no_such_workout}), 400
+    fields = user_fields()
+    if fields is None:
+        return jsonify({'error': error_codes.invalid_data}), 400
+    tag = version_tag(roster_versions, str(workout_id))
+    if fields != USER_FIELDS:
+        tag = '{0}-{1}'.format(tag, '.'.join(fields))
+    response = not_modified(tag)
+    if response is not None:
+        return response
     work = Workout.query.filter_by(id=workout_id).first()
     if work is None:
         return jsonify({'error': error_codes.no_such_workout}), 400
-    if curr_user.user_role == 'Client':
+    rows = keyset_batches(user_rows(fields).join(participates, participates.c.u_id == User.id).filter(
+        participates.c.w_id == workout_id), User.id)
+    return with_etag(stream_json({'error': error_codes.no_error}, 'all_users', rows,
+                                 partial(user_dict, fields=fields)), tag)
+
+
+@app.route('/user/workouts', methods=['GET'])
+@authenticated
+def get_user_workouts(curr_user):
+    """
+    Gets the workouts the curr_user participates in, one page at a
+    time. The query parameter when is 'upcoming' (the default), in
+    order of time, or 'past', newest first. The next page is fetched
+    by sending back the cursor next of the previous page, which holds
+    the (date_time, id) of its last workout, so every page is a range
+    scan of the participates primary key instead of an OFFSET.
+
+    :param curr_user: The current session user
+    :return: error code (= 0 if none), the Workout information of
+    the page and the cursor of the next page or None if it is the last
+    """
+    when = request.args.get('when', 'upcoming')
+    if when not in ('upcoming', 'past'):
+        return jsonify({'error': error_codes.invalid_data}), 400
+    rows = workout_rows().join(participates, participates.c.w_id == Workout.id).filter(
+        participates.c.u_id == curr_user.id)
+    now = datetime.datetime.now()
+    if when == 'upcoming':
+        rows = rows.filter(Workout.date_time >= now).order_by(Workout.date_time, Workout.id)
+    else:
+        rows = rows.filter(Workout.date_time < now).order_by(Workout.date_time.desc(), Workout.id.desc())
+    if 'cursor' in request.args:
+        values = decode_cursor(request.args['cursor'])
+        try:
+            after = [datetime.datetime.strptime(values[0], CURSOR_TIME_FORMAT), int(values[1])]
+        except (TypeError, ValueError, IndexError):
+            return jsonify({'error': error_codes.invalid_cursor}), 400
+        rows = rows.filter(keyset_after([Workout.date_time, Workout.id], after, descending=when == 'past'))
+    limit = page_size()
+    rows = rows.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1].date_time.strftime(CURSOR_TIME_FORMAT), rows[-1].id])
+    return jsonify({'error': error_codes.no_error, 'workouts': [workout_dict(row) for row in rows], 'next': next_cursor})
+
+
+@app.route('/admin/stats', methods=['GET'])
+@authenticated
+def get_stats(curr_user):
+    """
+    Gets the counters of the in-process caches and pools.
+
+    :param curr_user: The current session user
+    :return: error code (= 0 if none) and the counters
+    """
+    if curr_user.user_role != 'Admin':
         return jsonify({'error': error_codes.access_denied}), 403
     return jsonify({
         'error': error_codes.no_error,
-        'all_users': [{
-            'name': user.name,
-            'ssn': user.ssn,
-            'open_id': user.open_id,
-            'user_role': user.user_role,
-            'start_date': user.start_date,
-            'expire_date': user.expire_date
-        } for user in User.query.join(Workout.users).filter(Workout.id == workout_id).all()]
+        'stats': {
+            'hashing': hash_pool.stats(),
+            'token_cache': token_cache.stats(),
+            'unknown_users': unknown_users.stats(),
+            'schedule_cache': schedule_cache.stats(),
+            'staff_cache': staff_cache.stats()
+        }
     })
 
+
+@app.cli.command('check-attendance')
+@click.option('--fix', is_flag=True, help='Store the recounted numbers.')
+def check_attendance_command(fix):
+    """
+    Compares Workout.attending to the Participates table.
+    """
+    for workout_id, attending, participants in check_attendance(fix):
+        click.echo('workout {0}: attending {1}, participants {2}'.format(workout_id, attending, participants))
+
+
+@app.cli.command('check-coach-ids')
+@click.option('--fix', is_flag=True, help='Replace the open_ids by the ids of the coaches.')
+def check_coach_ids_command(fix):
+    """
+    Lists the workouts that store an open_id in Workout.coach_id.
+    """
+    for workout_id, open_id, user_id in check_coach_ids(fix):
+        click.echo('workout {0}: coach_id {1}, {2}'.format(
+            workout_id, open_id, 'no such user' if user_id is None else 'user {0}'.format(user_id)))
+
+
 if __name__ == '__main__':
     #db.drop_all()
     #db.create_all()
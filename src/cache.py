@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    A small thread safe in-process cache. Every entry has its
+    own expiry time and once the cache holds maxsize entries
+    the least recently used one is evicted.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        """
+
+        :param maxsize: the maximum number of entries kept
+        :param ttl: the default time to live of an entry in seconds
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored for key if it has not expired.
+
+        :param key: the key to look up
+        :param default: returned when the key is missing or expired
+        :return: the cached value or default
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """
+        Stores value for key. The entry lives for ttl seconds,
+        or the default ttl of the cache if ttl is None.
+
+        :param key: the key to store
+        :param value: the value to store
+        :param ttl: optional time to live in seconds
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_where(self, predicate):
+        """
+        Removes every entry whose value satisfies predicate.
+
+        :param predicate: a function taking a cached value
+        """
+        with self._lock:
+            for key in [k for k, (_, v) in self._data.items() if predicate(v)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses}
+
+
+class Versions:
+    """
+    Thread safe version numbers that only ever grow. Every key
+    has its own version and there is one generation shared by
+    all keys, so bumping it changes the version of every key.
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+
+        :param key: the key to look up
+        :return: a tuple of the generation and the version of key
+        """
+        with self._lock:
+            return self.generation, self._versions.get(key, 0)
+
+    def bump(self, key=None):
+        """
+        Increases the version of key, or the generation if key is None.
+
+        :param key: the key to bump or None
+        """
+        with self._lock:
+            if key is None:
+                self.generation += 1
+            else:
+                self._versions[key] = self._versions.get(key, 0) + 1
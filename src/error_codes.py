@@ -15,4 +15,13 @@ invalid_date_time = 13
 no_such_workout = 14
 workout_is_full = 15
 invalid_role = 16
-workout_already_exists = 17
\ No newline at end of file
+workout_already_exists = 17
+token_expired = 18
+server_busy = 19
+invalid_date_range = 20
+invalid_capacity = 21
+already_participating = 22
+workout_not_full = 23
+batch_too_large = 24
+invalid_data = 25
+invalid_cursor = 26
\ No newline at end of file
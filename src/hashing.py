@@ -0,0 +1,96 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PoolFull(Exception):
+    """
+    Raised when a HashPool has no room for another task.
+    """
+
+
+class HashPool:
+    """
+    A size limited pool of threads for the CPU heavy password
+    hashing. At most workers tasks run at once and at most
+    max_queue more wait for a thread; anything beyond that
+    is rejected straight away with PoolFull. The caller's
+    thread waits for the result, so a burst of logins holds
+    at most workers + max_queue request threads, which must
+    stay below the number of threads the server runs.
+    """
+
+    def __init__(self, workers=4, max_queue=4):
+        """
+
+        :param workers: the number of hashing threads
+        :param max_queue: how many tasks may wait for a thread
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait = 0.0
+        self.hash_time = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hash')
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+
+    def run(self, fun, *args):
+        """
+        Runs fun(*args) on a hashing thread and waits for the result.
+
+        :param fun: the function to run, e.g. check_password_hash
+        :param args: the arguments of fun
+        :return: whatever fun returns
+        :raises PoolFull: if the pool and its queue are full
+        """
+        return self._submit(fun, args).result()
+
+    def map(self, fun, arg_list):
+        """
+        Runs fun(*args) for every args in arg_list on the hashing
+        threads and waits for the results. At most workers tasks
+        are queued at once, so a big batch leaves room in the queue
+        for the logins that arrive meanwhile.
+
+        :param fun: the function to run, e.g. generate_password_hash
+        :param arg_list: a list of argument tuples
+        :return: the list of results, in the order of arg_list
+        :raises PoolFull: if the pool and its queue are full
+        """
+        results = []
+        for start in range(0, len(arg_list), self.workers):
+            futures = [self._submit(fun, args) for args in arg_list[start:start + self.workers]]
+            results += [future.result() for future in futures]
+        return results
+
+    def _submit(self, fun, args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PoolFull()
+        return self._executor.submit(self._task, time.perf_counter(), fun, args)
+
+    def _task(self, queued, fun, args):
+        started = time.perf_counter()
+        try:
+            return fun(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self.completed += 1
+                self.queue_wait += started - queued
+                self.hash_time += finished - started
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'queue_wait': self.queue_wait,
+                'hash_time': self.hash_time
+            }
@@ -41,6 +41,63 @@ def is_valid(ssn):
     return c == (11 - (sum([a * b for a, b in zip(map(int, list(ssn[0:8])), [3, 2, 7, 6, 5, 4, 3, 2])]) % 11)) % 11
 
 
+_NON_DIGIT = re.compile('[^0-9]')
+_TEN_DIGITS = re.compile('[0-9]{10}')
+_DAYS_IN_MONTH = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+_ZERO = ord('0')
+_NINE = ord('9')
+_TWO_DIGITS = 11 * _ZERO
+_CHECKSUM_OFFSET = (3 + 2 + 7 + 6 + 5 + 4 + 3 + 2) * _ZERO
+
+
+def is_valid_many(ssns):
+    """
+    Validates many Icelandic ssns for people at once, giving the
+    same answer as is_valid for every one of them. The patterns
+    are compiled once, the digits are read as bytes instead of
+    being converted one by one and the birth date and checksum
+    are checked with plain arithmetic, so it is several times
+    faster than calling is_valid in a loop.
+
+    :param ssns: an iterable of ssns
+    :return: a list with True for every valid ssn, in order
+    """
+    fullmatch, strip = _TEN_DIGITS.fullmatch, _NON_DIGIT.sub
+    days_in_month, zero, nine = _DAYS_IN_MONTH, _ZERO, _NINE
+    two_digits, checksum_offset = _TWO_DIGITS, _CHECKSUM_OFFSET
+    results = []
+    for ssn in ssns:
+        if type(ssn) != str:
+            results.append(False)
+            continue
+        if not fullmatch(ssn):
+            ssn = strip('', ssn)
+            if len(ssn) != 10:
+                results.append(False)
+                continue
+        d = ssn.encode('ascii')
+        if d[9] != zero and d[9] != nine:
+            results.append(False)
+            continue
+        day = d[0] * 10 + d[1] - two_digits
+        month = d[2] * 10 + d[3] - two_digits
+        year = (1900 if d[9] == nine else 2000) + d[4] * 10 + d[5] - two_digits
+        if month < 1 or month > 12 or day < 1:
+            results.append(False)
+            continue
+        if month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0):
+            if day > 29:
+                results.append(False)
+                continue
+        elif day > days_in_month[month]:
+            results.append(False)
+            continue
+        total = (3 * d[0] + 2 * d[1] + 7 * d[2] + 6 * d[3] + 5 * d[4] + 4 * d[5] + 3 * d[6] + 2 * d[7]
+                 - checksum_offset)
+        results.append(d[8] - zero == (11 - total % 11) % 11)
+    return results
+
+
 def valid_role(role):
     if role is None:
         return False
@@ -52,3 +109,16 @@ def valid_role(role):
         return True
     if role == 'Admin':
         return True
+
+
+def valid_capacity(capacity):
+    """
+    A capacity is the number of users that can
+    participate in a workout.
+
+    :param capacity: the capacity to validate
+    :return: True iff capacity is a positive integer
+    """
+    if type(capacity) != int:
+        return False
+    return capacity > 0
@@ -0,0 +1,29 @@
+"""
+Compares is_valid called in a loop with is_valid_many.
+Run with python -m test.bench_ssn from the repository root.
+"""
+import random
+import timeit
+
+from src.validator import is_valid, is_valid_many
+
+
+def make_ssns(count):
+    random.seed(0)
+    ssns = []
+    for _ in range(count):
+        ssn = '{0:02d}{1:02d}{2:02d}{3:03d}{4}'.format(
+            random.randint(1, 31), random.randint(1, 12), random.randint(0, 99),
+            random.randint(0, 999), random.choice('09'))
+        ssns.append(ssn[:6] + '-' + ssn[6:] if random.random() < 0.5 else ssn)
+    return ssns
+
+
+if __name__ == '__main__':
+    ssns = make_ssns(20000)
+    assert is_valid_many(ssns) == [is_valid(ssn) for ssn in ssns]
+    loop = min(timeit.repeat(lambda: [is_valid(ssn) for ssn in ssns], number=1, repeat=5))
+    batch = min(timeit.repeat(lambda: is_valid_many(ssns), number=1, repeat=5))
+    print('{0} ssns'.format(len(ssns)))
+    print('is_valid      {0:.4f}s'.format(loop))
+    print('is_valid_many {0:.4f}s ({1:.1f}x)'.format(batch, loop / batch))
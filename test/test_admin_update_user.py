@@ -10,6 +10,7 @@ class TestAdminUpdateUser(unittest.TestCase):
     def setUp(self):
         app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
         db.create_all()
+        reset_caches()
         self.list_of_users = FakeUsers().list_of_users
         for user in self.list_of_users:
             db.session.add(user)
@@ -52,6 +53,34 @@ class TestAdminUpdateUser(unittest.TestCase):
         self.assertEqual(200, res.status_code)
         self.assertEqual(json.loads(res.data), {'error': error_codes.no_error})
 
+    def test_admin_update_user_role_revokes_tokens(self):
+        user = self.list_of_users[0]
+        tmp_oid = user.open_id
+        stale = jwt.encode(
+            {'open_id': tmp_oid, 'id': user.id, 'role': 'Client', 'type': 'access',
+             'iat': datetime.datetime.utcnow() - datetime.timedelta(seconds=10),
+             'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=5)},
+            app.config['SECRET_KEY'],
+            algorithm='HS256'
+        )
+        app.test_client().put('/admin/user/name/update/' + tmp_oid,
+                              headers=self.headers_sent, data=json.dumps({'role': 'Coach'}))
+        res = app.test_client().get('/get_user', headers={'fenrir-token': stale})
+        self.assertEqual(json.loads(res.data), {'error': error_codes.token_expired})
+        fresh, _ = issue_tokens(User.query.filter_by(open_id=tmp_oid).one())
+        res = app.test_client().get('/get_user', headers={'fenrir-token': fresh})
+        self.assertEqual(json.loads(res.data)['user']['role'], 'Coach')
+
+    def test_admin_update_user_role_revokes_tokens_same_second(self):
+        coach = self.list_of_users[3]
+        tmp_oid = coach.open_id
+        token, _ = issue_tokens(coach)
+        app.test_client().put('/admin/user/name/update/' + tmp_oid,
+                              headers=self.headers_sent, data=json.dumps({'role': 'Client'}))
+        res = app.test_client().get('/user/coaches', headers={'fenrir-token': token})
+        self.assertEqual(401, res.status_code)
+        self.assertEqual(json.loads(res.data), {'error': error_codes.token_expired})
+
     def test_admin_update_user_access_denied(self):
         tmp_oid = self.list_of_users[0].open_id
         body_to_send = {'role': 'Coach'}
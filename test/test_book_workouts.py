@@ -0,0 +1,92 @@
+import unittest
+
+from flask import json
+
+from src.api import *
+from test.util.fake_data import *
+
+
+class TestBookWorkouts(unittest.TestCase):
+    def setUp(self):
+        app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
+        db.create_all()
+        reset_caches()
+        self.list_of_users = FakeUsers().list_of_users
+        for user in self.list_of_users:
+            db.session.add(user)
+        self.list_of_workouts = FakeWorkouts().list_of_workouts
+        self.list_of_workouts[2].capacity = 1
+        self.list_of_workouts[2].attending = 1
+        for work in self.list_of_workouts:
+            db.session.add(work)
+        self.list_of_workouts[2].users = [self.list_of_users[1]]
+        db.session.commit()
+        self.headers_sent = {
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+            'fenrir-token': issue_tokens(self.list_of_users[0])[0]
+        }
+
+    def tearDown(self):
+        db.drop_all()
+
+    def book(self, body_to_send):
+        res = app.test_client().post('/workout/book', headers=self.headers_sent, data=json.dumps(body_to_send))
+        return res.status_code, json.loads(res.data)
+
+    def test_book_workouts_successfully(self):
+        self.assertEqual(self.book({'workout_ids': [1, 3, 69, 4]}), (200, {
+            'error': error_codes.no_error,
+            'results': [
+                {'id': 1, 'result': 'attended'},
+                {'id': 3, 'result': 'full'},
+                {'id': 69, 'result': 'missing'},
+                {'id': 4, 'result': 'attended'}
+            ]
+        }))
+        booked = db.session.query(participates.c.w_id).filter(participates.c.u_id == 1).order_by(participates.c.w_id)
+        self.assertEqual(booked.all(), [(1,), (4,)])
+        self.assertEqual(check_attendance(), [])
+
+    def test_book_workouts_already_attending(self):
+        self.book({'workout_ids': [1]})
+        self.assertEqual(self.book({'workout_ids': [1, 1]})[1]['results'],
+                         [{'id': 1, 'result': 'attended'}, {'id': 1, 'result': 'attended'}])
+        self.assertEqual(db.session.query(Workout.attending).filter_by(id=1).scalar(), 1)
+
+    def test_book_workouts_series(self):
+        db.session.add(WorkoutSeries(id=1, coach_id=4, weekday=3, time=datetime.time(7), description='Morning',
+                                     capacity=2, starts=datetime.datetime(2017, 11, 20)))
+        db.session.commit()
+        occurrence = {'series_id': 1, 'day': '2017-11-30'}
+        self.assertEqual(self.book({'workout_ids': [1, occurrence, {'series_id': 1, 'day': '2017-11-29'}]}), (200, {
+            'error': error_codes.no_error,
+            'results': [
+                {'id': 1, 'result': 'attended'},
+                {'series_id': 1, 'day': '2017-11-30', 'id': 5, 'result': 'attended'},
+                {'series_id': 1, 'day': '2017-11-29', 'id': None, 'result': 'missing'}
+            ]
+        }))
+        self.assertEqual(db.session.query(Workout.attending).filter_by(id=5, series_id=1).scalar(), 1)
+        self.assertEqual(self.book({'workout_ids': [occurrence]})[1]['results'][0]['id'], 5)
+        for entry in ({'series_id': '1', 'day': '2017-11-30'}, {'series_id': 1, 'day': 'today'}, {'series_id': 1}):
+            self.assertEqual(self.book({'workout_ids': [entry]}), (400, {'error': error_codes.invalid_data}))
+
+    def test_book_workouts_missing_data(self):
+        self.assertEqual(self.book({'A': 'B'}), (400, {'error': error_codes.missing_data}))
+
+    def test_book_workouts_empty_data(self):
+        self.assertEqual(self.book({'workout_ids': []}), (400, {'error': error_codes.empty_data}))
+
+    def test_book_workouts_too_many(self):
+        workout_ids = list(range(app.config['MAX_BATCH_BOOKINGS'] + 1))
+        self.assertEqual(self.book({'workout_ids': workout_ids}), (400, {'error': error_codes.batch_too_large}))
+
+    def test_book_workouts_invalid_ids(self):
+        for workout_ids in ([{'a': 1}], ['1'], [1.0], [1, True]):
+            self.assertEqual(self.book({'workout_ids': workout_ids}), (400, {'error': error_codes.invalid_data}))
+        self.assertEqual(db.session.query(Workout.attending).filter_by(id=1).scalar(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
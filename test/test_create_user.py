@@ -9,6 +9,7 @@ class TestApi(unittest.TestCase):
     def setUp(self):
         app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
         db.create_all()
+        reset_caches()
         self.list_of_users = FakeUsers().list_of_users
         for user in self.list_of_users:
             db.session.add(user)
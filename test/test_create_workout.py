@@ -10,6 +10,7 @@ class TestCreateWorkout(unittest.TestCase):
     def setUp(self):
         app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
         db.create_all()
+        reset_caches()
         self.list_of_users = FakeUsers().list_of_users
         for user in self.list_of_users:
             db.session.add(user)
@@ -41,6 +42,22 @@ class TestCreateWorkout(unittest.TestCase):
         self.assertEqual(200, res.status_code)
         self.assertEqual(json.loads(res.data), {'error': error_codes.no_error})
 
+    def test_create_workout_with_capacity(self):
+        body_to_send = {'coach_id': self.list_of_users[3].open_id, 'description': '123456', 'date': '11/11/2017',
+                        'time': '12:00', 'capacity': 20}
+        res = app.test_client().post('/workout', headers=self.headers_sent, data=json.dumps(body_to_send))
+        self.assertEqual(json.loads(res.data), {'error': error_codes.no_error})
+        capacity = db.session.query(Workout.capacity).filter_by(
+            date_time=datetime.datetime(2017, 11, 11, 12, 0)).scalar()
+        self.assertEqual(capacity, 20)
+
+    def test_create_workout_invalid_capacity(self):
+        body_to_send = {'coach_id': self.list_of_users[3].open_id, 'description': '123456', 'date': '11/11/2017',
+                        'time': '12:00', 'capacity': 0}
+        res = app.test_client().post('/workout', headers=self.headers_sent, data=json.dumps(body_to_send))
+        self.assertEqual(400, res.status_code)
+        self.assertEqual(json.loads(res.data), {'error': error_codes.invalid_capacity})
+
     def test_create_workout_missing_data_one(self):
         # No coach_id
         headers_sent = {'Accept': 'application/json', 'Content-Type': 'application/json',
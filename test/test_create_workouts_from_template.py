@@ -0,0 +1,104 @@
+import unittest
+
+from flask import json
+from sqlalchemy import event
+
+from src.api import *
+from test.util.fake_data import *
+
+
+class TestCreateWorkoutsFromTemplate(unittest.TestCase):
+    def setUp(self):
+        app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
+        db.create_all()
+        reset_caches()
+        self.list_of_users = FakeUsers().list_of_users
+        for user in self.list_of_users:
+            db.session.add(user)
+        self.list_of_workouts = FakeWorkouts().list_of_workouts
+        for work in self.list_of_workouts:
+            db.session.add(work)
+        db.session.commit()
+        self.open_ids = [user.open_id for user in self.list_of_users]
+        self.headers_sent = {'fenrir-token': issue_tokens(self.list_of_users[5])[0]}
+        self.client_headers = {'fenrir-token': issue_tokens(self.list_of_users[0])[0]}
+
+    def tearDown(self):
+        db.drop_all()
+
+    def post(self, body, headers=None):
+        res = app.test_client().post('/workout/template', headers=headers or self.headers_sent,
+                                     data=json.dumps(body), content_type='application/json')
+        return res.status_code, json.loads(res.data)
+
+    def template(self, **changes):
+        body = {
+            'from': '2017-11-27',
+            'to': '2017-12-10',
+            'classes': [
+                {'weekday': 0, 'time': '07:00', 'coach_id': self.open_ids[3], 'description': 'Morning'},
+                {'weekday': 3, 'time': '08:00', 'coach_id': self.open_ids[4], 'description': 'Lift', 'capacity': 8},
+                {'weekday': 4, 'time': '12:00', 'coach_id': self.open_ids[5], 'description': 'Lunch'},
+            ]
+        }
+        body.update(changes)
+        return body
+
+    def test_template_creates_occurrences(self):
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            status, data = self.post(self.template())
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+        self.assertEqual(200, status)
+        self.assertEqual(data['created'], 4)
+        self.assertEqual(data['conflicts'], [
+            {'date_time': 'Thu, 30 Nov 2017 08:00:00 GMT', 'class': 1},
+            {'date_time': 'Fri, 01 Dec 2017 12:00:00 GMT', 'class': 2},
+        ])
+        self.assertEqual(len([s for s in statements if s.startswith('INSERT')]), 1)
+        rows = db.session.query(Workout.date_time, Workout.coach_id, Workout.capacity).filter(
+            Workout.id > 4).order_by(Workout.date_time).all()
+        self.assertEqual(rows, [
+            (datetime.datetime(2017, 11, 27, 7, 0), 4, 12),
+            (datetime.datetime(2017, 12, 4, 7, 0), 4, 12),
+            (datetime.datetime(2017, 12, 7, 8, 0), 5, 8),
+            (datetime.datetime(2017, 12, 8, 12, 0), 6, 12),
+        ])
+
+    def test_template_updates_schedule(self):
+        app.test_client().get('/workout/all/2017-12-04', headers=self.headers_sent)
+        self.post(self.template())
+        res = app.test_client().get('/workout/all/2017-12-04', headers=self.headers_sent)
+        self.assertEqual([w['description'] for w in json.loads(res.data)['all_workouts']], ['Morning'])
+
+    def test_template_invalid_coach(self):
+        body = self.template()
+        body['classes'][0]['coach_id'] = self.open_ids[0]
+        self.assertEqual(self.post(body), (403, {'error': error_codes.access_denied}))
+        body['classes'][0]['coach_id'] = 'nobody'
+        self.assertEqual(self.post(body), (400, {'error': error_codes.no_such_user}))
+        self.assertEqual(Workout.query.count(), 4)
+
+    def test_template_invalid(self):
+        self.assertEqual(self.post(self.template(to='2017-11-26')), (400, {'error': error_codes.invalid_date_range}))
+        self.assertEqual(self.post(self.template(to='2017-13-01')), (400, {'error': error_codes.invalid_date_time}))
+        self.assertEqual(self.post(self.template(**{'from': 20171127})), (400, {'error': error_codes.invalid_date_time}))
+        self.assertEqual(self.post(self.template(to=None)), (400, {'error': error_codes.invalid_date_time}))
+        self.assertEqual(self.post(self.template(classes=[])), (400, {'error': error_codes.missing_data}))
+        body = self.template()
+        body['classes'][0]['weekday'] = 7
+        self.assertEqual(self.post(body), (400, {'error': error_codes.invalid_date_time}))
+        body = self.template()
+        body['classes'][0]['time'] = '25:00'
+        self.assertEqual(self.post(body), (400, {'error': error_codes.invalid_date_time}))
+        self.assertEqual(self.post(self.template(), self.client_headers), (403, {'error': error_codes.access_denied}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,4 @@
+import threading
 import unittest
 
 from flask import json
@@ -10,6 +11,7 @@ class TestGetAll(unittest.TestCase):
     def setUp(self):
         app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
         db.create_all()
+        reset_caches()
         self.list_of_users = FakeUsers().list_of_users
         for user in self.list_of_users:
             db.session.add(user)
@@ -45,7 +47,9 @@ class TestGetAll(unittest.TestCase):
         db.drop_all()
 
     def test_get_all_users_as_admin_successfully(self):
-        res = app.test_client().get('/user/all', headers=self.headers_sent)
+        for user in self.list_of_users:
+            db.session.refresh(user)
+        res = app.test_client().get('/user/all?all=true', headers=self.headers_sent)
         self.maxDiff = None
         self.assertEqual(200, res.status_code)
         self.assertEqual(json.loads(res.data), {'all_users': [
@@ -157,6 +161,86 @@ class TestGetAll(unittest.TestCase):
                                                 'error': error_codes.no_error,
                                                 })
 
+    def test_get_all_users_streamed_same_bytes(self):
+        with app.test_request_context():
+            expected = jsonify({'error': error_codes.no_error,
+                                'all_users': [user_dict(row) for row in user_rows().order_by(User.id)]}).data
+        app.config['STREAM_BATCH_SIZE'] = 2
+        try:
+            res = app.test_client().get('/user/all?all=true', headers=self.headers_sent)
+        finally:
+            app.config['STREAM_BATCH_SIZE'] = 100
+        self.assertTrue(res.is_streamed)
+        self.assertEqual(res.mimetype, 'application/json')
+        self.assertEqual(res.data, expected)
+
+    def test_get_all_users_stream_does_not_block_bookings(self):
+        booking_headers = {'fenrir-token': issue_tokens(self.list_of_users[0])[0]}
+        app.config['STREAM_BATCH_SIZE'] = 2
+        try:
+            res = app.test_client().get('/user/all?all=true', headers=self.headers_sent, buffered=False)
+            chunks = iter(res.response)
+            first = next(chunks)
+            results = []
+            booking = threading.Thread(target=lambda: results.append(
+                app.test_client().get('/workout/1', headers=booking_headers)))
+            booking.start()
+            booking.join(timeout=5)
+            rest = b''.join(chunks)
+        finally:
+            app.config['STREAM_BATCH_SIZE'] = 100
+        self.assertFalse(booking.is_alive())
+        self.assertEqual(200, results[0].status_code)
+        self.assertEqual(json.loads(results[0].data)['message'], 'attended')
+        self.assertEqual(len(json.loads(first + rest)['all_users']), len(self.list_of_users))
+
+    def pages(self, query):
+        open_ids, url = [], '/user/all' + query
+        while True:
+            res = app.test_client().get(url, headers=self.headers_sent)
+            self.assertEqual(200, res.status_code)
+            data = json.loads(res.data)
+            open_ids.append([user['open_id'] for user in data['all_users']])
+            if data['next'] is None:
+                return open_ids
+            url = '/user/all' + query + '&cursor=' + data['next']
+
+    def test_get_all_users_pages_by_id(self):
+        open_ids = [user.open_id for user in self.list_of_users]
+        self.assertEqual(self.pages('?limit=5'), [open_ids[:5], open_ids[5:10], open_ids[10:]])
+
+    def test_get_all_users_pages_by_name(self):
+        by_name = [user.open_id for user in sorted(self.list_of_users, key=lambda user: (user.name, user.id))]
+        pages = self.pages('?order=name&limit=4')
+        self.assertEqual([len(page) for page in pages], [4, 4, 4, 1])
+        self.assertEqual(sum(pages, []), by_name)
+
+    def test_get_all_users_page_size_capped(self):
+        app.config['MAX_PAGE_SIZE'] = 3
+        try:
+            self.assertEqual(len(self.pages('?limit=1000')[0]), 3)
+        finally:
+            app.config['MAX_PAGE_SIZE'] = 100
+
+    def test_get_all_users_fields(self):
+        res = app.test_client().get('/user/all?fields=name,open_id&limit=2', headers=self.headers_sent)
+        all_users = json.loads(res.data)['all_users']
+        self.assertEqual([sorted(user) for user in all_users], [['name', 'open_id'], ['name', 'open_id']])
+        self.assertEqual(self.pages('?fields=open_id&order=name&limit=5'), self.pages('?order=name&limit=5'))
+        res = app.test_client().get('/user/all?all=true&fields=open_id', headers=self.headers_sent)
+        self.assertEqual(sorted(json.loads(res.data)['all_users'][0]), ['open_id'])
+
+    def test_get_all_users_unknown_field(self):
+        for query in ('?fields=name,password', '?fields=', '?all=true&fields=id'):
+            res = app.test_client().get('/user/all' + query, headers=self.headers_sent)
+            self.assertEqual(400, res.status_code)
+            self.assertEqual(json.loads(res.data), {'error': error_codes.invalid_data})
+
+    def test_get_all_users_invalid_cursor(self):
+        res = app.test_client().get('/user/all?order=name&cursor=' + encode_cursor([3]), headers=self.headers_sent)
+        self.assertEqual(400, res.status_code)
+        self.assertEqual(json.loads(res.data), {'error': error_codes.invalid_cursor})
+
     def test_get_all_users_as_non_admin_unsuccessfully(self):
         res = app.test_client().get('/user/all', headers=self.headers_sent2)
         self.assertEqual(403, res.status_code)
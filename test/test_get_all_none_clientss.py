@@ -10,6 +10,7 @@ class TestGetAllNoneClients(unittest.TestCase):
     def setUp(self):
         app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
         db.create_all()
+        reset_caches()
         self.list_of_users = FakeUsers().list_of_users
         for user in self.list_of_users:
             db.session.add(user)
@@ -46,6 +47,8 @@ class TestGetAllNoneClients(unittest.TestCase):
 
     def test_get_all_non_clients_as_admin_successfully(self):
         self.maxDiff = None
+        for user in self.list_of_users:
+            db.session.refresh(user)
         res = app.test_client().get('/user/coaches', headers=self.headers_sent)
         self.assertEqual(200, res.status_code)
         self.assertEqual(json.loads(res.data), {'all_users': [
@@ -85,6 +88,42 @@ class TestGetAllNoneClients(unittest.TestCase):
                                                 'error': error_codes.no_error,
                                                 })
 
+    def staff(self):
+        res = app.test_client().get('/user/coaches', headers=self.headers_sent)
+        return [user['open_id'] for user in json.loads(res.data)['all_users']]
+
+    def test_get_all_non_clients_cached(self):
+        self.staff()
+        hits = staff_cache.hits
+        self.staff()
+        self.assertEqual(staff_cache.hits, hits + 1)
+
+    def test_get_all_non_clients_follows_role_change(self):
+        open_ids = [user.open_id for user in self.list_of_users]
+        self.assertEqual(self.staff(), open_ids[3:7])
+        body_to_send = {'role': 'Coach'}
+        app.test_client().put('/admin/user/name/update/' + open_ids[0], headers=self.headers_sent,
+                              data=json.dumps(body_to_send))
+        self.assertEqual(self.staff(), [open_ids[0]] + open_ids[3:7])
+        app.test_client().delete('/admin/user/delete/' + open_ids[3], headers=self.headers_sent)
+        self.assertEqual(self.staff(), [open_ids[0]] + open_ids[4:7])
+
+    def test_get_all_non_clients_follows_client_change(self):
+        open_ids = [user.open_id for user in self.list_of_users]
+        self.staff()
+        body_to_send = {'expire_date': '1/1/2019'}
+        app.test_client().put('/admin/user/name/update/' + open_ids[0], headers=self.headers_sent,
+                              data=json.dumps(body_to_send))
+        hits = staff_cache.hits
+        self.assertEqual(self.staff(), open_ids[3:7])
+        self.assertEqual(staff_cache.hits, hits + 1)
+
+    def test_get_all_non_clients_fields(self):
+        open_ids = [user.open_id for user in self.list_of_users]
+        res = app.test_client().get('/user/coaches?fields=open_id', headers=self.headers_sent)
+        self.assertEqual(json.loads(res.data)['all_users'], [{'open_id': open_id} for open_id in open_ids[3:7]])
+        self.assertEqual(len(self.staff()), 4)
+
     def test_get_all_non_clients_as_admin_unsuccessfully(self):
         res = app.test_client().get('/user/coaches', headers=self.headers_sent2)
         self.assertEqual(403, res.status_code)
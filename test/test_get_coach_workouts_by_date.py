@@ -10,6 +10,7 @@ class TestGetCoachWorkoutsByDate(unittest.TestCase):
     def setUp(self):
         app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
         db.create_all()
+        reset_caches()
         self.list_of_users = FakeUsers().list_of_users
         for user in self.list_of_users:
             db.session.add(user)
@@ -65,6 +66,20 @@ class TestGetCoachWorkoutsByDate(unittest.TestCase):
         })
         """
 
+    def test_get_coach_workouts_only_own(self):
+        res = app.test_client().get('/workout/coach/' + '2017-11-30', headers=self.headers_sent)
+        self.assertEqual(200, res.status_code)
+        all_workouts = json.loads(res.data)['all_workouts']
+        self.assertEqual([w['id'] for w in all_workouts], [2])
+        self.assertEqual(all_workouts[0]['coach_name'], self.list_of_users[4].name)
+
+    def test_get_coach_workouts_uses_index(self):
+        day_start = datetime.datetime(2017, 11, 30)
+        query = schedule_query(day_start, day_start + datetime.timedelta(days=1)).filter(Workout.coach_id == 5)
+        statement = str(query.statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+        plan = ' '.join(row[-1] for row in db.engine.execute('EXPLAIN QUERY PLAN ' + statement))
+        self.assertIn('ix_workout_coach_id_date_time', plan)
+
     def test_get_workout_unsuccessfully(self):
         res = app.test_client().get('/workout/coach/' + '2017-11-30', headers=self.invalid_headers_sent)
         self.assertEqual(403, res.status_code)
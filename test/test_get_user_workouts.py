@@ -0,0 +1,67 @@
+import unittest
+
+from flask import json
+
+from src.api import *
+from test.util.fake_data import *
+
+
+class TestGetUserWorkouts(unittest.TestCase):
+    def setUp(self):
+        app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
+        db.create_all()
+        reset_caches()
+        self.list_of_users = FakeUsers().list_of_users
+        for user in self.list_of_users:
+            db.session.add(user)
+        self.list_of_workouts = FakeWorkouts().list_of_workouts
+        soon = datetime.datetime.now().replace(microsecond=0) + datetime.timedelta(days=1)
+        self.list_of_workouts += [
+            Workout(id=5, coach_id=4, date_time=soon, description='Upcoming'),
+            Workout(id=6, coach_id=5, date_time=soon + datetime.timedelta(hours=1), description='Upcoming'),
+            Workout(id=7, coach_id=4, date_time=soon + datetime.timedelta(days=1), description='Upcoming'),
+        ]
+        for work in self.list_of_workouts:
+            db.session.add(work)
+            work.users = [self.list_of_users[0]]
+        self.list_of_workouts[1].users = [self.list_of_users[1]]
+        db.session.commit()
+        self.headers_sent = {'fenrir-token': issue_tokens(self.list_of_users[0])[0]}
+
+    def tearDown(self):
+        db.drop_all()
+
+    def get(self, query):
+        res = app.test_client().get('/user/workouts' + query, headers=self.headers_sent)
+        return res.status_code, json.loads(res.data)
+
+    def pages(self, query):
+        ids, status, data = [], *self.get(query)
+        while True:
+            self.assertEqual(200, status)
+            ids.append([w['id'] for w in data['workouts']])
+            if data['next'] is None:
+                return ids
+            status, data = self.get(query + '&cursor=' + data['next'])
+
+    def test_get_user_workouts_upcoming(self):
+        status, data = self.get('')
+        self.assertEqual(200, status)
+        self.assertEqual([w['id'] for w in data['workouts']], [5, 6, 7])
+        self.assertEqual(data['workouts'][0]['description'], 'Upcoming')
+        self.assertIsNone(data['next'])
+
+    def test_get_user_workouts_upcoming_pages(self):
+        self.assertEqual(self.pages('?limit=1'), [[5], [6], [7]])
+        self.assertEqual(self.pages('?limit=2'), [[5, 6], [7]])
+
+    def test_get_user_workouts_past_pages(self):
+        self.assertEqual(self.pages('?when=past&limit=2'), [[4, 3], [1]])
+
+    def test_get_user_workouts_invalid(self):
+        self.assertEqual(self.get('?cursor=abc'), (400, {'error': error_codes.invalid_cursor}))
+        self.assertEqual(self.get('?when=tomorrow'), (400, {'error': error_codes.invalid_data}))
+
+
+if __name__ == '__main__':
+    unittest.main()
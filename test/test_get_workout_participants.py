@@ -10,6 +10,7 @@ class TestGetWorkoutParticipants(unittest.TestCase):
     def setUp(self):
         app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
         db.create_all()
+        reset_caches()
         self.list_of_users = FakeUsers().list_of_users
         for user in self.list_of_users:
             db.session.add(user)
@@ -76,6 +77,49 @@ class TestGetWorkoutParticipants(unittest.TestCase):
         self.assertEqual(200, res.status_code)
         self.assertEqual(json.loads(res.data), {'all_users': [], 'error': error_codes.no_error })
 
+    def test_get_participants_streamed_same_bytes(self):
+        workout = self.list_of_workouts[0]
+        workout.users = [self.list_of_users[1], self.list_of_users[0]]
+        db.session.commit()
+        with app.test_request_context():
+            expected = jsonify({'error': error_codes.no_error,
+                                'all_users': [user_dict(row) for row in user_rows().filter(User.id.in_([1, 2]))]}).data
+        res = app.test_client().get('/workout/users/1', headers=self.headers_sent)
+        self.assertTrue(res.is_streamed)
+        self.assertIn('ETag', res.headers)
+        self.assertEqual(res.data, expected)
+
+    def test_get_participants_fields(self):
+        workout = self.list_of_workouts[0]
+        workout.users = [self.list_of_users[0], self.list_of_users[1]]
+        names = [self.list_of_users[0].name, self.list_of_users[1].name]
+        db.session.commit()
+        res = app.test_client().get('/workout/users/1?fields=name', headers=self.headers_sent)
+        self.assertEqual(json.loads(res.data)['all_users'], [{'name': name} for name in names])
+        full = app.test_client().get('/workout/users/1', headers=self.headers_sent)
+        self.assertNotEqual(res.headers['ETag'], full.headers['ETag'])
+
+    def test_get_participants_not_modified(self):
+        url = '/workout/users/' + str(self.list_of_workouts[0].id)
+        res = app.test_client().get(url, headers=self.headers_sent)
+        headers_sent = dict(self.headers_sent, **{'If-None-Match': res.headers['ETag']})
+        res = app.test_client().get(url, headers=headers_sent)
+        self.assertEqual(304, res.status_code)
+        app.test_client().get('/workout/1', headers=self.headers_sent)
+        res = app.test_client().get(url, headers=headers_sent)
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(len(json.loads(res.data)['all_users']), 1)
+
+    def test_get_participants_not_modified_padded_id(self):
+        url = '/workout/users/01'
+        res = app.test_client().get(url, headers=self.headers_sent)
+        self.assertEqual(json.loads(res.data)['all_users'], [])
+        headers_sent = dict(self.headers_sent, **{'If-None-Match': res.headers['ETag']})
+        app.test_client().get('/workout/1', headers=self.headers_sent)
+        res = app.test_client().get(url, headers=headers_sent)
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(len(json.loads(res.data)['all_users']), 1)
+
     def test_get_all_participants_as_non_admin_unsuccessfully(self):
         res = app.test_client().get('/user/all', headers=self.invalid_headers_sent)
         self.assertEqual(403, res.status_code)
@@ -1,6 +1,7 @@
 import unittest
 
 from flask import json
+from sqlalchemy import event
 
 from src.api import *
 from test.util.fake_data import *
@@ -10,6 +11,7 @@ class TestGetWorkoutsByDate(unittest.TestCase):
     def setUp(self):
         app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
         db.create_all()
+        reset_caches()
         self.list_of_users = FakeUsers().list_of_users
         for user in self.list_of_users:
             db.session.add(user)
@@ -41,7 +43,7 @@ class TestGetWorkoutsByDate(unittest.TestCase):
                                                 'workout':
                                                     {
                                                         'id': workout.id,
-                                                        'coach_id': workout.coach_id,
+                                                        'coach_id': '4',
                                                         'description': workout.description,
                                                         'date_time': 'Thu, 30 Nov 2017 08:00:00 GMT',
                                                     }
@@ -52,6 +54,134 @@ class TestGetWorkoutsByDate(unittest.TestCase):
         self.assertEqual(400, res.status_code)
         self.assertEqual(json.loads(res.data), {'error': error_codes.invalid_date_time })
 
+    def test_get_workouts_by_date_successfully(self):
+        res = app.test_client().get('/workout/all/' + '2017-11-30', headers=self.headers_sent)
+        self.assertEqual(200, res.status_code)
+        all_workouts = json.loads(res.data)['all_workouts']
+        self.assertEqual([w['id'] for w in all_workouts], [1, 2, 3])
+        self.assertEqual(all_workouts[0], {
+            'id': 1,
+            'coach_name': 'Manni',
+            'coach_id': '4',
+            'description': '5 CockPushUps',
+            'date_time': 'Thu, 30 Nov 2017 08:00:00 GMT',
+            'attending': 0,
+            'capacity': 12,
+            'waitlisted': 0,
+            'series_id': None
+        })
+
+    def test_get_workouts_by_date_coach_open_id(self):
+        coach = User(id=50, open_id='coach-fifty', name='Fimmtiu', ssn='5', password='x', user_role='Coach')
+        db.session.add(coach)
+        db.session.add(Workout(id=5, coach_id=50, date_time=datetime.datetime(2017, 12, 2, 9, 0), description='Row'))
+        db.session.commit()
+        res = app.test_client().get('/workout/all/' + '2017-12-02', headers=self.headers_sent)
+        workout = json.loads(res.data)['all_workouts'][0]
+        self.assertEqual(workout['coach_id'], 'coach-fifty')
+        res = app.test_client().get('/workout/today/' + '2017-12-02-09-00-00', headers=self.headers_sent)
+        self.assertEqual(json.loads(res.data)['workout']['coach_id'], 'coach-fifty')
+        body_to_send = {'coach_id': workout['coach_id'], 'description': 'Row harder'}
+        res = app.test_client().put('/admin/workout/update/5', headers=self.headers_sent, data=json.dumps(body_to_send))
+        self.assertEqual(json.loads(res.data), {'error': error_codes.no_error})
+        self.assertEqual(db.session.query(Workout.coach_id).filter_by(id=5).scalar(), 50)
+
+    def test_get_workouts_by_date_repairs_open_id_coaches(self):
+        coach = User(id=50, open_id='coach-fifty', name='Fimmtiu', ssn='5', password='x', user_role='Coach')
+        db.session.add(coach)
+        db.session.commit()
+        db.session.execute("INSERT INTO workout (id, coach_id, date_time, description) VALUES "
+                           "(5, 'coach-fifty', '2017-12-02 09:00:00.000000', 'Row'), "
+                           "(6, 'gone', '2017-12-02 10:00:00.000000', 'Row')")
+        db.session.commit()
+        res = app.test_client().get('/workout/all/' + '2017-12-02', headers=self.headers_sent)
+        self.assertEqual([w['coach_id'] for w in json.loads(res.data)['all_workouts']], [None, None])
+        res = app.test_cli_runner().invoke(args=['check-coach-ids', '--fix'])
+        self.assertEqual(res.output, 'workout 5: coach_id coach-fifty, user 50\nworkout 6: coach_id gone, no such user\n')
+        self.assertEqual(check_coach_ids(), [(6, 'gone', None)])
+        res = app.test_client().get('/workout/all/' + '2017-12-02', headers=self.headers_sent)
+        self.assertEqual([w['coach_id'] for w in json.loads(res.data)['all_workouts']], ['coach-fifty', None])
+
+    def test_get_workouts_by_date_deleted_coach(self):
+        res = app.test_client().delete('/admin/user/delete/4', headers=self.headers_sent)
+        self.assertEqual(json.loads(res.data), {'error': error_codes.no_error})
+        res = app.test_client().get('/workout/today/' + '2017-11-30-08-00-00', headers=self.headers_sent)
+        self.assertEqual(200, res.status_code)
+        self.assertEqual(json.loads(res.data)['workout']['coach_id'], None)
+        res = app.test_client().get('/workout/all/' + '2017-11-30', headers=self.headers_sent)
+        all_workouts = json.loads(res.data)['all_workouts']
+        self.assertEqual([w['id'] for w in all_workouts], [1, 2, 3])
+        self.assertEqual((all_workouts[0]['coach_id'], all_workouts[0]['coach_name']), (None, None))
+
+    def test_get_workouts_by_date_single_statement(self):
+        self.list_of_workouts[1].users = [self.list_of_users[0], self.list_of_users[1]]
+        self.list_of_workouts[1].attending = 2
+        db.session.commit()
+        token, _ = issue_tokens(self.list_of_users[6])
+        app.test_client().get('/workout/all/' + '2017-12-01', headers={'fenrir-token': token})
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            res = app.test_client().get('/workout/all/' + '2017-11-30', headers={'fenrir-token': token})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+        self.assertEqual(len(statements), 1)
+        all_workouts = json.loads(res.data)['all_workouts']
+        self.assertEqual([w['attending'] for w in all_workouts], [0, 2, 0])
+        self.assertEqual([w['coach_name'] for w in all_workouts], ['Manni', 'Johann', 'Manni'])
+
+    def test_get_workouts_by_date_cached(self):
+        url = '/workout/all/' + '2017-11-30'
+        app.test_client().get(url, headers=self.headers_sent)
+        hits = schedule_cache.hits
+        res = app.test_client().get(url, headers=self.headers_sent)
+        self.assertEqual(schedule_cache.hits, hits + 1)
+        self.assertEqual([w['attending'] for w in json.loads(res.data)['all_workouts']], [0, 0, 0])
+        app.test_client().get('/workout/1', headers=self.headers_sent)
+        res = app.test_client().get(url, headers=self.headers_sent)
+        self.assertEqual([w['attending'] for w in json.loads(res.data)['all_workouts']], [1, 0, 0])
+
+    def test_get_workouts_by_date_cache_follows_moved_workout(self):
+        app.test_client().get('/workout/all/' + '2017-11-30', headers=self.headers_sent)
+        app.test_client().get('/workout/all/' + '2017-12-01', headers=self.headers_sent)
+        body_to_send = {'date': '1/12/2017'}
+        app.test_client().put('/admin/workout/update/1', headers=self.headers_sent, data=json.dumps(body_to_send))
+        res = app.test_client().get('/workout/all/' + '2017-11-30', headers=self.headers_sent)
+        self.assertEqual([w['id'] for w in json.loads(res.data)['all_workouts']], [2, 3])
+        res = app.test_client().get('/workout/all/' + '2017-12-01', headers=self.headers_sent)
+        self.assertEqual([w['id'] for w in json.loads(res.data)['all_workouts']], [1, 4])
+
+    def test_get_workouts_by_date_not_modified(self):
+        url = '/workout/all/' + '2017-11-30'
+        res = app.test_client().get(url, headers=self.headers_sent)
+        tag = res.headers['ETag']
+        headers_sent = dict(self.headers_sent, **{'If-None-Match': tag})
+        res = app.test_client().get(url, headers=headers_sent)
+        self.assertEqual(304, res.status_code)
+        self.assertEqual(b'', res.data)
+        res = app.test_client().get('/workout/all/' + '2017-12-01', headers=headers_sent)
+        self.assertEqual(200, res.status_code)
+        app.test_client().get('/workout/1', headers=self.headers_sent)
+        res = app.test_client().get(url, headers=headers_sent)
+        self.assertEqual(200, res.status_code)
+        self.assertNotEqual(tag, res.headers['ETag'])
+
+    def test_get_workouts_by_date_no_workouts(self):
+        res = app.test_client().get('/workout/all/' + '2017-12-02', headers=self.headers_sent)
+        self.assertEqual(json.loads(res.data), {'error': error_codes.no_error, 'all_workouts': []})
+
+    def test_get_workouts_by_date_invalid_date(self):
+        res = app.test_client().get('/workout/all/' + '2017-13-01', headers=self.headers_sent)
+        self.assertEqual(400, res.status_code)
+        self.assertEqual(json.loads(res.data), {'error': error_codes.invalid_date_time})
+        res = app.test_client().get('/workout/all/' + '9999-12-31', headers=self.headers_sent)
+        self.assertEqual(400, res.status_code)
+        self.assertEqual(json.loads(res.data), {'error': error_codes.invalid_date_time})
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,70 @@
+import unittest
+
+from flask import json
+
+from src.api import *
+from test.util.fake_data import *
+
+
+class TestGetWorkoutsByRange(unittest.TestCase):
+    def setUp(self):
+        app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
+        db.create_all()
+        reset_caches()
+        self.list_of_users = FakeUsers().list_of_users
+        for user in self.list_of_users:
+            db.session.add(user)
+        self.list_of_workouts = FakeWorkouts().list_of_workouts
+        for work in self.list_of_workouts:
+            db.session.add(work)
+        db.session.commit()
+
+        expire_time = datetime.datetime.utcnow() + datetime.timedelta(weeks=1)
+        valid_token = jwt.encode(
+            {'open_id': self.list_of_users[0].open_id, 'exp': expire_time},
+            app.config['SECRET_KEY'],
+            algorithm='HS256'
+        )
+        self.headers_sent = {
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+            'fenrir-token': valid_token
+        }
+
+    def tearDown(self):
+        db.drop_all()
+
+    def test_get_workouts_by_range_successfully(self):
+        res = app.test_client().get('/workout/range/2017-11-29/2017-12-01', headers=self.headers_sent)
+        self.assertEqual(200, res.status_code)
+        all_workouts = json.loads(res.data)['all_workouts']
+        self.assertEqual(sorted(all_workouts), ['2017-11-29', '2017-11-30', '2017-12-01'])
+        self.assertEqual(all_workouts['2017-11-29'], [])
+        self.assertEqual([w['id'] for w in all_workouts['2017-11-30']], [1, 2, 3])
+        self.assertEqual([w['id'] for w in all_workouts['2017-12-01']], [4])
+        day = json.loads(app.test_client().get('/workout/all/2017-11-30', headers=self.headers_sent).data)
+        self.assertEqual(all_workouts['2017-11-30'], day['all_workouts'])
+
+    def test_get_workouts_by_range_single_day(self):
+        res = app.test_client().get('/workout/range/2017-12-01/2017-12-01', headers=self.headers_sent)
+        all_workouts = json.loads(res.data)['all_workouts']
+        self.assertEqual([w['id'] for w in all_workouts['2017-12-01']], [4])
+
+    def test_get_workouts_by_range_reversed(self):
+        res = app.test_client().get('/workout/range/2017-12-01/2017-11-30', headers=self.headers_sent)
+        self.assertEqual(400, res.status_code)
+        self.assertEqual(json.loads(res.data), {'error': error_codes.invalid_date_range})
+
+    def test_get_workouts_by_range_too_long(self):
+        res = app.test_client().get('/workout/range/2017-01-01/2017-12-31', headers=self.headers_sent)
+        self.assertEqual(400, res.status_code)
+        self.assertEqual(json.loads(res.data), {'error': error_codes.invalid_date_range})
+
+    def test_get_workouts_by_range_invalid_date(self):
+        res = app.test_client().get('/workout/range/2017-11-31/2017-12-01', headers=self.headers_sent)
+        self.assertEqual(400, res.status_code)
+        self.assertEqual(json.loads(res.data), {'error': error_codes.invalid_date_time})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import base64
+import threading
+import unittest
+
+from flask import json
+
+import src.api
+from src.api import *
+from src.hashing import HashPool, PoolFull
+from test.util.fake_data import *
+
+
+class TestHashPool(unittest.TestCase):
+    def setUp(self):
+        app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
+        db.create_all()
+        reset_caches()
+        self.list_of_users = FakeUsers().list_of_users
+        for user in self.list_of_users:
+            db.session.add(user)
+        db.session.commit()
+        self.default_pool = src.api.hash_pool
+
+    def tearDown(self):
+        src.api.hash_pool = self.default_pool
+        db.drop_all()
+
+    def test_hash_pool_counts(self):
+        pool = HashPool(workers=2, max_queue=2)
+        self.assertEqual(pool.run(pow, 2, 10), 1024)
+        stats = pool.stats()
+        self.assertEqual(stats['completed'], 1)
+        self.assertEqual(stats['rejected'], 0)
+
+    def test_hash_pool_map(self):
+        pool = HashPool(workers=3, max_queue=0)
+        self.assertEqual(pool.map(pow, [(2, i) for i in range(10)]), [2 ** i for i in range(10)])
+        self.assertEqual(pool.stats()['completed'], 10)
+
+    def occupy(self, pool):
+        started, release = threading.Event(), threading.Event()
+
+        def hold():
+            started.set()
+            release.wait()
+
+        blocker = threading.Thread(target=pool.run, args=(hold,))
+        blocker.start()
+        started.wait()
+        return blocker, release
+
+    def test_hash_pool_rejects_when_full(self):
+        pool = HashPool(workers=1, max_queue=0)
+        blocker, release = self.occupy(pool)
+        self.assertRaises(PoolFull, pool.run, pow, 2, 10)
+        release.set()
+        blocker.join()
+        self.assertEqual(pool.stats()['rejected'], 1)
+
+    def test_login_busy(self):
+        pool = HashPool(workers=1, max_queue=0)
+        src.api.hash_pool = pool
+        blocker, release = self.occupy(pool)
+        user = self.list_of_users[0]
+        authentication = base64.b64encode(bytes('{0}:{1}'.format(user.ssn, 'abcdef'), 'utf-8')).decode('utf-8')
+        headers_sent = {'Accept': 'application/json', 'Authorization': 'Basic {0}'.format(authentication)}
+        res = app.test_client().get('/login', headers=headers_sent)
+        release.set()
+        blocker.join()
+        self.assertEqual(503, res.status_code)
+        self.assertEqual(res.headers['Retry-After'], str(app.config['HASH_RETRY_AFTER']))
+        self.assertEqual(json.loads(res.data), {'error': error_codes.server_busy})
+
+
+if __name__ == '__main__':
+    unittest.main()
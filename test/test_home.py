@@ -10,6 +10,7 @@ class TestHome(unittest.TestCase):
     def setUp(self):
         app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
         db.create_all()
+        reset_caches()
         self.list_of_users = FakeUsers().list_of_users
         for user in self.list_of_users:
             db.session.add(user)
@@ -42,6 +43,24 @@ class TestHome(unittest.TestCase):
         res = app.test_client().get('/', headers=headers_sent)
         self.assertEqual(json.loads(res.data), {'error': error_codes.no_such_user})
 
+    def test_authentication_no_such_user_remembered(self):
+        expire_time = datetime.datetime.utcnow() + datetime.timedelta(weeks=1)
+        valid_token = jwt.encode(
+            {'open_id': 'asdfsdafasdfasdf', 'exp': expire_time},
+            app.config['SECRET_KEY'],
+            algorithm='HS256'
+        )
+        headers_sent = {'Accept': 'application/json', 'Content-Type': 'application/json', 'fenrir-token': valid_token}
+        app.test_client().get('/', headers=headers_sent)
+        self.assertIsNotNone(unknown_users.get('asdfsdafasdfasdf'))
+        hits = unknown_users.hits
+        res = app.test_client().get('/', headers=headers_sent)
+        self.assertEqual(json.loads(res.data), {'error': error_codes.no_such_user})
+        self.assertEqual(unknown_users.hits, hits + 1)
+        body_to_send = {'name': 'Nyr', 'password': 'abcdef', 'ssn': '0101302989'}
+        app.test_client().post('/user', headers=headers_sent, data=json.dumps(body_to_send))
+        self.assertIsNone(unknown_users.get('asdfsdafasdfasdf'))
+
     def test_authentication_invalid_token(self):
         headers_sent = {'Accept': 'application/json', 'Content-Type': 'application/json', 'fenrir-token': 'ABCD1234'}
         res = app.test_client().get('/', headers=headers_sent)
@@ -0,0 +1,114 @@
+import unittest
+
+from flask import json
+
+from src.api import *
+from test.util.fake_data import *
+
+
+def make_ssns(count):
+    ssns = []
+    for serial in range(100, 10000):
+        head = '0101{0:04d}'.format(serial)
+        c = (11 - sum(a * b for a, b in zip(map(int, head), [3, 2, 7, 6, 5, 4, 3, 2])) % 11) % 11
+        if c < 10:
+            ssns.append(head + str(c) + '9')
+        if len(ssns) == count:
+            return ssns
+
+
+class TestImportUsers(unittest.TestCase):
+    def setUp(self):
+        app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
+        db.create_all()
+        reset_caches()
+        self.list_of_users = FakeUsers().list_of_users
+        for user in self.list_of_users:
+            db.session.add(user)
+        db.session.commit()
+        self.taken_ssn = self.list_of_users[0].ssn
+        self.headers_sent = {'fenrir-token': issue_tokens(self.list_of_users[5])[0]}
+        self.coach_headers = {'fenrir-token': issue_tokens(self.list_of_users[3])[0]}
+
+    def tearDown(self):
+        db.drop_all()
+
+    def post(self, data, content_type='application/json', headers=None):
+        res = app.test_client().post('/admin/user/import', headers=headers or self.headers_sent,
+                                     data=data, content_type=content_type)
+        return res.status_code, json.loads(res.data)
+
+    def test_import_json(self):
+        ssns = make_ssns(3)
+        members = [{'name': 'Member {0}'.format(i), 'password': 'abcdef', 'ssn': ssn} for i, ssn in enumerate(ssns)]
+        status, data = self.post(json.dumps(members))
+        self.assertEqual((status, data), (200, {'error': error_codes.no_error, 'imported': 3, 'errors': []}))
+        user = User.query.filter_by(ssn=ssns[1]).one()
+        self.assertEqual((user.name, user.user_role), ('Member 1', 'Client'))
+        self.assertTrue(check_password_hash(user.password, 'abcdef'))
+        authentication = base64.b64encode(bytes('{0}:abcdef'.format(ssns[2]), 'utf-8')).decode('utf-8')
+        res = app.test_client().get('/login', headers={'Authorization': 'Basic {0}'.format(authentication)})
+        self.assertEqual(json.loads(res.data)['error'], error_codes.no_error)
+
+    def test_import_report(self):
+        ssns = make_ssns(2)
+        members = [
+            {'name': 'A', 'password': 'abcdef', 'ssn': ssns[0]},
+            {'name': 'B', 'password': 'abc', 'ssn': ssns[1]},
+            {'name': 'C', 'password': 'abcdef', 'ssn': '1234567890'},
+            {'name': 'D', 'password': 'abcdef', 'ssn': self.taken_ssn},
+            {'name': 'E', 'password': 'abcdef', 'ssn': ssns[0]},
+            {'name': 'F', 'password': 'abcdef'},
+            {'name': '', 'password': 'abcdef', 'ssn': ssns[1]},
+            {'name': 7, 'password': 'abcdef', 'ssn': ssns[1]},
+        ]
+        status, data = self.post(json.dumps(members))
+        self.assertEqual(200, status)
+        self.assertEqual(data['imported'], 1)
+        self.assertEqual(data['errors'], [
+            {'row': 2, 'error': error_codes.invalid_password},
+            {'row': 3, 'error': error_codes.invalid_ssn},
+            {'row': 4, 'error': error_codes.user_already_exists},
+            {'row': 5, 'error': error_codes.user_already_exists},
+            {'row': 6, 'error': error_codes.missing_data},
+            {'row': 7, 'error': error_codes.empty_data},
+            {'row': 8, 'error': error_codes.invalid_data},
+        ])
+        self.assertEqual(User.query.count(), len(self.list_of_users) + 1)
+
+    def test_import_csv_and_json_lines(self):
+        ssns = make_ssns(4)
+        body = 'name,password,ssn\r\nJon,abcdef,{0}\r\nGunna,abcdef,{1}\r\n'.format(*ssns)
+        self.assertEqual(self.post(body, 'text/csv')[1]['imported'], 2)
+        body = '\n'.join(json.dumps({'name': 'Line', 'password': 'abcdef', 'ssn': ssn}) for ssn in ssns[1:])
+        status, data = self.post(body, 'application/x-ndjson')
+        self.assertEqual(data['imported'], 2)
+        self.assertEqual(data['errors'], [{'row': 1, 'error': error_codes.user_already_exists}])
+
+    def test_import_chunks(self):
+        app.config['IMPORT_CHUNK_SIZE'] = 7
+        try:
+            ssns = make_ssns(30)
+            members = [{'name': 'Member', 'password': 'abcdef', 'ssn': ssn} for ssn in ssns]
+            status, data = self.post(json.dumps(members))
+        finally:
+            app.config['IMPORT_CHUNK_SIZE'] = 500
+        self.assertEqual(data['imported'], 30)
+        self.assertEqual(User.query.filter(User.ssn.in_(ssns)).count(), 30)
+
+    def test_import_invalid(self):
+        self.assertEqual(self.post('{"name": "A"}'), (400, {'error': error_codes.invalid_data}))
+        self.assertEqual(self.post('not json'), (400, {'error': error_codes.invalid_data}))
+        self.assertEqual(self.post('[]'), (400, {'error': error_codes.empty_data}))
+        self.assertEqual(self.post('[]', headers=self.coach_headers), (403, {'error': error_codes.access_denied}))
+
+    def test_import_too_large(self):
+        app.config['MAX_IMPORT_ROWS'] = 2
+        try:
+            self.assertEqual(self.post(json.dumps([{}, {}, {}])), (400, {'error': error_codes.batch_too_large}))
+        finally:
+            app.config['MAX_IMPORT_ROWS'] = 50000
+
+
+if __name__ == '__main__':
+    unittest.main()
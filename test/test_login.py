@@ -11,6 +11,7 @@ class TestLogin(unittest.TestCase):
     def setUp(self):
         app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
         db.create_all()
+        reset_caches()
         self.list_of_users = FakeUsers().list_of_users
         for user in self.list_of_users:
             db.session.add(user)
@@ -32,6 +33,32 @@ class TestLogin(unittest.TestCase):
         body_received = json.loads(res.data)
         self.assertEqual(body_received['error'], error_codes.no_error)
 
+    def test_login_token_carries_id_and_role(self):
+        user = self.list_of_users[5]
+        authentication = base64.b64encode(bytes('{0}:{1}'.format(user.ssn, 'abcdef'), 'utf-8')).decode('utf-8')
+        headers_sent = {'Accept': 'application/json', 'Authorization': 'Basic {0}'.format(authentication)}
+        body_received = json.loads(app.test_client().get('/login', headers=headers_sent).data)
+        data = jwt.decode(body_received['token'], app.config['SECRET_KEY'], algorithms='HS256')
+        self.assertEqual(data['id'], user.id)
+        self.assertEqual(data['role'], 'Admin')
+        self.assertEqual(data['type'], 'access')
+        res = app.test_client().get('/user/all', headers={'fenrir-token': body_received['token']})
+        self.assertEqual(200, res.status_code)
+
+    def test_refresh_token(self):
+        user = self.list_of_users[0]
+        authentication = base64.b64encode(bytes('{0}:{1}'.format(user.ssn, 'abcdef'), 'utf-8')).decode('utf-8')
+        headers_sent = {'Accept': 'application/json', 'Authorization': 'Basic {0}'.format(authentication)}
+        body_received = json.loads(app.test_client().get('/login', headers=headers_sent).data)
+        res = app.test_client().get('/token/refresh', headers={'fenrir-refresh-token': body_received['refresh_token']})
+        self.assertEqual(200, res.status_code)
+        token = json.loads(res.data)['token']
+        res = app.test_client().get('/get_user', headers={'fenrir-token': token})
+        self.assertEqual(json.loads(res.data)['user']['name'], user.name)
+        # an access token is not a refresh token
+        res = app.test_client().get('/token/refresh', headers={'fenrir-refresh-token': token})
+        self.assertEqual({'error': error_codes.invalid_token}, json.loads(res.data))
+
     def test_login_missing_headers(self):
         headers_sent = {'Accept': 'application/json', 'Content-Type': 'application/json'}
         res = app.test_client().get('/login', headers=headers_sent)
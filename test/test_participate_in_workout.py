@@ -10,6 +10,7 @@ class TestParticipateInWorkout(unittest.TestCase):
     def setUp(self):
         app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
         db.create_all()
+        reset_caches()
         self.list_of_users = FakeUsers().list_of_users
         for user in self.list_of_users:
             db.session.add(user)
@@ -56,6 +57,36 @@ class TestParticipateInWorkout(unittest.TestCase):
         self.assertEqual(200, res.status_code)
         self.assertEqual(json.loads(res.data), {'error': error_codes.no_error, 'message': 'removed'})
 
+    def test_participate_updates_attending(self):
+        workout_id = self.list_of_workouts[0].id
+        app.test_client().get('/workout/' + str(workout_id), headers=self.headers_sent)
+        app.test_client().get('/workout/' + str(workout_id), headers=self.headers_sent2)
+        self.assertEqual(db.session.query(Workout.attending).filter_by(id=workout_id).scalar(), 2)
+        app.test_client().get('/workout/' + str(workout_id), headers=self.headers_sent)
+        self.assertEqual(db.session.query(Workout.attending).filter_by(id=workout_id).scalar(), 1)
+        self.assertEqual(check_attendance(), [])
+
+    def test_check_attendance(self):
+        self.list_of_workouts[0].users = [self.list_of_users[0], self.list_of_users[1]]
+        db.session.commit()
+        self.assertEqual(check_attendance(), [(1, 0, 2)])
+        self.assertEqual(check_attendance(fix=True), [(1, 0, 2)])
+        self.assertEqual(check_attendance(), [])
+        self.assertEqual(db.session.query(Workout.attending).filter_by(id=1).scalar(), 2)
+
+    def test_participate_respects_capacity(self):
+        body_to_send = {'capacity': 1}
+        expire_time = datetime.datetime.utcnow() + datetime.timedelta(weeks=1)
+        admin_token = jwt.encode({'open_id': self.list_of_users[5].open_id, 'exp': expire_time},
+                                 app.config['SECRET_KEY'], algorithm='HS256')
+        res = app.test_client().put('/admin/workout/update/1', data=json.dumps(body_to_send),
+                                    headers={'Content-Type': 'application/json', 'fenrir-token': admin_token})
+        self.assertEqual(json.loads(res.data), {'error': error_codes.no_error})
+        res = app.test_client().get('/workout/1', headers=self.headers_sent)
+        self.assertEqual(json.loads(res.data), {'error': error_codes.no_error, 'message': 'attended'})
+        res = app.test_client().get('/workout/1', headers=self.headers_sent2)
+        self.assertEqual(json.loads(res.data), {'error': error_codes.workout_is_full})
+
     def test_participate_no_such_workout(self):
         res = app.test_client().get('/workout/' + '69', headers=self.headers_sent)
         self.assertEqual(400, res.status_code)
@@ -66,6 +97,7 @@ class TestParticipateInWorkout(unittest.TestCase):
         workout.users = [self.list_of_users[0], self.list_of_users[1], self.list_of_users[2], self.list_of_users[3],
                          self.list_of_users[4], self.list_of_users[5], self.list_of_users[6], self.list_of_users[7],
                          self.list_of_users[11], self.list_of_users[10], self.list_of_users[9], self.list_of_users[8], ]
+        workout.attending = 12
         res = app.test_client().get('/workout/' + str(workout.id), headers=self.headers_sent2)
         self.assertEqual(400, res.status_code)
         self.assertEqual(json.loads(res.data), {'error': error_codes.workout_is_full})
@@ -0,0 +1,74 @@
+import threading
+import unittest
+
+from flask import json
+
+from src.api import *
+from test.util.fake_data import *
+
+
+class TestParticipateStress(unittest.TestCase):
+    def setUp(self):
+        app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
+        db.create_all()
+        reset_caches()
+        self.list_of_users = FakeUsers().list_of_users
+        for user in self.list_of_users:
+            db.session.add(user)
+        self.list_of_workouts = FakeWorkouts().list_of_workouts
+        for work in self.list_of_workouts:
+            db.session.add(work)
+        self.members = [
+            User(id=100 + i, open_id='member-{0}'.format(i), name='Member {0}'.format(i),
+                 ssn='m{0}'.format(i), password='x', user_role='Client')
+            for i in range(30)
+        ]
+        for user in self.members:
+            db.session.add(user)
+        db.session.commit()
+        self.tokens = [issue_tokens(user)[0] for user in self.members]
+        db.session.remove()
+
+    def tearDown(self):
+        db.drop_all()
+
+    def hammer(self, tokens, times):
+        results = []
+        start = threading.Barrier(len(tokens))
+
+        def member(token):
+            client = app.test_client()
+            start.wait()
+            for _ in range(times):
+                res = client.get('/workout/1', headers={'fenrir-token': token})
+                results.append(json.loads(res.data))
+
+        threads = [threading.Thread(target=member, args=(token,)) for token in tokens]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def participants(self):
+        return db.session.query(participates).filter(participates.c.w_id == 1).count()
+
+    def test_participate_capacity_holds(self):
+        results = self.hammer(self.tokens, 1)
+        attended = [r for r in results if r.get('message') == 'attended']
+        full = [r for r in results if r == {'error': error_codes.workout_is_full}]
+        self.assertEqual(len(attended), app.config['WORKOUT_CAPACITY'])
+        self.assertEqual(len(attended) + len(full), len(self.tokens))
+        self.assertEqual(self.participants(), app.config['WORKOUT_CAPACITY'])
+        self.assertEqual(check_attendance(), [])
+
+    def test_participate_toggle_storm(self):
+        results = self.hammer(self.tokens, 5)
+        self.assertEqual(len(results), 5 * len(self.tokens))
+        self.assertTrue(all(r['error'] in (error_codes.no_error, error_codes.workout_is_full) for r in results))
+        self.assertLessEqual(self.participants(), app.config['WORKOUT_CAPACITY'])
+        self.assertEqual(check_attendance(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,6 +10,7 @@ class TestRemoveUserById(unittest.TestCase):
     def setUp(self):
         app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
         db.create_all()
+        reset_caches()
         self.list_of_users = FakeUsers().list_of_users
         for user in self.list_of_users:
             db.session.add(user)
@@ -40,6 +41,27 @@ class TestRemoveUserById(unittest.TestCase):
         self.assertEqual(json.loads(res.data), {'error': error_codes.no_error})
         self.assertIsNone(db.session.query(User.id).filter_by(open_id=u_id).scalar())
 
+    def test_removed_user_token_rejected(self):
+        u_id = self.list_of_users[0].open_id
+        expire_time = datetime.datetime.utcnow() + datetime.timedelta(weeks=1)
+        removed_token = jwt.encode({'open_id': u_id, 'exp': expire_time}, app.config['SECRET_KEY'], algorithm='HS256')
+        headers_sent = {'Accept': 'application/json', 'Content-Type': 'application/json', 'fenrir-token': removed_token}
+        self.assertEqual(200, app.test_client().get('/get_user', headers=headers_sent).status_code)
+        app.test_client().delete('/admin/user/delete/{0}'.format(u_id), headers=self.headers_sent)
+        res = app.test_client().get('/get_user', headers=headers_sent)
+        self.assertEqual(401, res.status_code)
+        self.assertEqual(json.loads(res.data), {'error': error_codes.no_such_user})
+
+    def test_remove_user_updates_attending(self):
+        u_id = self.list_of_users[0].open_id
+        expire_time = datetime.datetime.utcnow() + datetime.timedelta(weeks=1)
+        token = jwt.encode({'open_id': u_id, 'exp': expire_time}, app.config['SECRET_KEY'], algorithm='HS256')
+        app.test_client().get('/workout/1', headers={'fenrir-token': token})
+        self.assertEqual(db.session.query(Workout.attending).filter_by(id=1).scalar(), 1)
+        app.test_client().delete('/admin/user/delete/{0}'.format(u_id), headers=self.headers_sent)
+        self.assertEqual(db.session.query(Workout.attending).filter_by(id=1).scalar(), 0)
+        self.assertEqual(check_attendance(), [])
+
     def test_remove_user_as_non_admin(self):
         expire_time = datetime.datetime.utcnow() + datetime.timedelta(weeks=1)
         valid_token = jwt.encode(
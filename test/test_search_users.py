@@ -0,0 +1,65 @@
+import unittest
+
+from flask import json
+
+from src.api import *
+from test.util.fake_data import *
+
+
+class TestSearchUsers(unittest.TestCase):
+    def setUp(self):
+        app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
+        db.create_all()
+        reset_caches()
+        self.list_of_users = FakeUsers().list_of_users
+        for user in self.list_of_users:
+            db.session.add(user)
+        db.session.commit()
+        self.headers_sent = {'fenrir-token': issue_tokens(self.list_of_users[3])[0]}
+        self.client_headers = {'fenrir-token': issue_tokens(self.list_of_users[0])[0]}
+
+    def tearDown(self):
+        db.drop_all()
+
+    def search(self, query, headers=None):
+        res = app.test_client().get('/user/search' + query, headers=headers or self.headers_sent)
+        return res.status_code, json.loads(res.data)
+
+    def test_search_by_name(self):
+        status, data = self.search('?q=H&fields=name')
+        self.assertEqual(200, status)
+        self.assertEqual(data['users'], [{'name': 'Hassi'}, {'name': 'Hinn Arnar'}, {'name': 'Hoddz'}])
+        status, data = self.search('?q=Ma')
+        self.assertEqual([user['name'] for user in data['users']], ['Maggi', 'Manni'])
+        self.assertEqual(sorted(data['users'][0]), sorted(USER_FIELDS))
+
+    def test_search_top_k(self):
+        status, data = self.search('?q=Sw&limit=1')
+        self.assertEqual([user['name'] for user in data['users']], ['Swaglord'])
+
+    def test_search_by_ssn(self):
+        status, data = self.search('?by=ssn&q=10&fields=ssn')
+        self.assertEqual(data['users'], [{'ssn': '1002873319'}, {'ssn': '1006893169'}])
+
+    def test_search_no_match(self):
+        self.assertEqual(self.search('?q=Zz'), (200, {'error': error_codes.no_error, 'users': []}))
+
+    def test_search_last_code_point(self):
+        self.assertEqual(self.search('?q=H%F4%8F%BF%BF'), (200, {'error': error_codes.no_error, 'users': []}))
+        self.assertEqual(self.search('?q=%F4%8F%BF%BF'), (200, {'error': error_codes.no_error, 'users': []}))
+        self.assertEqual(self.search('?q=a%ED%9F%BF'), (200, {'error': error_codes.no_error, 'users': []}))
+
+    def test_search_uses_index(self):
+        plan = db.session.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM user WHERE name >= 'Ma' AND name < 'Mb' ORDER BY name, id"
+        ).fetchall()
+        self.assertIn('ix_user_name', str(plan))
+
+    def test_search_invalid(self):
+        self.assertEqual(self.search('?q='), (400, {'error': error_codes.empty_data}))
+        self.assertEqual(self.search('?q=H&by=role'), (400, {'error': error_codes.invalid_data}))
+        self.assertEqual(self.search('?q=H', self.client_headers), (403, {'error': error_codes.access_denied}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 from unittest import TestCase
-from src.validator import is_valid
+from src.validator import is_valid, is_valid_many
 
 
 class TestIsValid(TestCase):
@@ -47,3 +47,13 @@ class TestIsValid(TestCase):
     def testValidCompanySSNToFail(self):
         self.assertFalse(is_valid('681201-2890'))
 
+    def testManySameAsIsValid(self):
+        ssns = self.valid + [None, 1012821313, '1231', '150599-1608', '330189-1999', '681201-2890',
+                             '290200-0009', '290200-0000', '2902 00 0000', '１００２８７３３１９', '']
+        for year in ('00', '04', '99'):
+            for month in range(14):
+                for day in range(33):
+                    for century in '09':
+                        ssns += ['{0:02d}{1:02d}{2}33{3}{4}'.format(day, month, year, c, century) for c in range(10)]
+        self.assertEqual(is_valid_many(ssns), [is_valid(ssn) for ssn in ssns])
+        self.assertEqual(is_valid_many([]), [])
@@ -10,6 +10,7 @@ class TestUpdateUserName(unittest.TestCase):
     def setUp(self):
         app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
         db.create_all()
+        reset_caches()
         self.list_of_users = FakeUsers().list_of_users
         for user in self.list_of_users:
             db.session.add(user)
@@ -44,6 +45,14 @@ class TestUpdateUserName(unittest.TestCase):
         self.assertEqual(name, 'Herbie Hancock')
         self.assertEqual(ssn, tmp_ssn)
 
+    def test_update_user_name_visible_through_cached_token(self):
+        res = app.test_client().get('/get_user', headers=self.headers_sent)
+        self.assertEqual(json.loads(res.data)['user']['name'], 'Hassi')
+        body_to_send = {'name': 'Herbie Hancock'}
+        app.test_client().put('/user/name/update', headers=self.headers_sent, data=json.dumps(body_to_send))
+        res = app.test_client().get('/get_user', headers=self.headers_sent)
+        self.assertEqual(json.loads(res.data)['user']['name'], 'Herbie Hancock')
+
     def test_update_user_name_missing_data(self):
         body_to_send = {'A': 'B'}
         res = app.test_client().put('/user/name/update', headers=self.headers_sent, data=json.dumps(body_to_send))
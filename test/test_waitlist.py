@@ -0,0 +1,89 @@
+import unittest
+
+from flask import json
+
+from src.api import *
+from test.util.fake_data import *
+
+
+class TestWaitlist(unittest.TestCase):
+    def setUp(self):
+        app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
+        db.create_all()
+        reset_caches()
+        self.list_of_users = FakeUsers().list_of_users
+        for user in self.list_of_users:
+            db.session.add(user)
+        self.list_of_workouts = FakeWorkouts().list_of_workouts
+        self.list_of_workouts[0].capacity = 1
+        for work in self.list_of_workouts:
+            db.session.add(work)
+        db.session.commit()
+        self.headers = [{'fenrir-token': issue_tokens(user)[0]} for user in self.list_of_users]
+        self.open_ids = [user.open_id for user in self.list_of_users]
+
+    def tearDown(self):
+        db.drop_all()
+
+    def get(self, url, user):
+        res = app.test_client().get(url, headers=self.headers[user])
+        return res.status_code, json.loads(res.data)
+
+    def workout(self):
+        return db.session.query(Workout.attending, Workout.waitlisted).filter_by(id=1).one()
+
+    def test_waitlist_and_promotion(self):
+        self.get('/workout/1', 0)
+        self.assertEqual(self.get('/workout/waitlist/1', 1),
+                         (200, {'error': error_codes.no_error, 'message': 'waitlisted', 'position': 1}))
+        self.assertEqual(self.get('/workout/waitlist/1', 2),
+                         (200, {'error': error_codes.no_error, 'message': 'waitlisted', 'position': 2}))
+        self.assertEqual(tuple(self.workout()), (1, 2))
+        self.assertEqual(self.get('/workout/1', 0), (200, {'error': error_codes.no_error, 'message': 'removed'}))
+        self.assertEqual(tuple(self.workout()), (1, 1))
+        booked = db.session.query(participates.c.u_id).filter(participates.c.w_id == 1).all()
+        self.assertEqual(booked, [(2,)])
+        schedule = self.get('/workout/all/2017-11-30', 5)[1]['all_workouts']
+        self.assertEqual((schedule[0]['attending'], schedule[0]['waitlisted']), (1, 1))
+
+    def test_leave_waitlist(self):
+        self.get('/workout/1', 0)
+        self.get('/workout/waitlist/1', 1)
+        self.assertEqual(self.get('/workout/waitlist/1', 1),
+                         (200, {'error': error_codes.no_error, 'message': 'removed'}))
+        self.assertEqual(tuple(self.workout()), (1, 0))
+
+    def test_waitlist_workout_not_full(self):
+        self.assertEqual(self.get('/workout/waitlist/2', 1), (400, {'error': error_codes.workout_not_full}))
+
+    def test_waitlist_already_participating(self):
+        self.get('/workout/1', 0)
+        self.assertEqual(self.get('/workout/waitlist/1', 0), (400, {'error': error_codes.already_participating}))
+
+    def test_waitlist_no_such_workout(self):
+        self.assertEqual(self.get('/workout/waitlist/69', 0), (400, {'error': error_codes.no_such_workout}))
+
+    def test_capacity_increase_promotes(self):
+        self.get('/workout/1', 0)
+        self.get('/workout/waitlist/1', 1)
+        self.get('/workout/waitlist/1', 2)
+        res = app.test_client().put('/admin/workout/update/1', data=json.dumps({'capacity': 2}),
+                                    headers=dict(self.headers[5], **{'Content-Type': 'application/json'}))
+        self.assertEqual(json.loads(res.data), {'error': error_codes.no_error})
+        self.assertEqual(tuple(self.workout()), (2, 1))
+
+    def test_removed_user_leaves_waitlist(self):
+        self.get('/workout/1', 0)
+        self.get('/workout/waitlist/1', 1)
+        self.get('/workout/waitlist/1', 2)
+        app.test_client().delete('/admin/user/delete/{0}'.format(self.open_ids[0]),
+                                 headers=self.headers[5])
+        self.assertEqual(tuple(self.workout()), (1, 1))
+        app.test_client().delete('/admin/user/delete/{0}'.format(self.open_ids[2]),
+                                 headers=self.headers[5])
+        self.assertEqual(tuple(self.workout()), (1, 0))
+        self.assertEqual(check_attendance(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
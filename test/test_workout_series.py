@@ -0,0 +1,158 @@
+import unittest
+
+from flask import json
+
+from src.api import *
+from test.util.fake_data import *
+
+
+class TestWorkoutSeries(unittest.TestCase):
+    def setUp(self):
+        app.config['SQLALCHEMY_DATABASE_URI'] = TEST_SQLITE_URI
+        db.create_all()
+        reset_caches()
+        self.list_of_users = FakeUsers().list_of_users
+        for user in self.list_of_users:
+            db.session.add(user)
+        self.list_of_workouts = FakeWorkouts().list_of_workouts
+        for work in self.list_of_workouts:
+            db.session.add(work)
+        db.session.commit()
+        self.open_ids = [user.open_id for user in self.list_of_users]
+        self.headers = [{'fenrir-token': issue_tokens(user)[0]} for user in self.list_of_users]
+        status, data = self.send('post', '/workout/series', 5, {
+            'weekday': 3, 'time': '07:00', 'coach_id': self.open_ids[3], 'description': 'Morning',
+            'capacity': 2, 'from': '2017-11-20'
+        })
+        self.series_id = data['series_id']
+
+    def tearDown(self):
+        db.drop_all()
+
+    def send(self, method, url, user, body=None):
+        res = getattr(app.test_client(), method)(url, headers=self.headers[user], data=json.dumps(body),
+                                                 content_type='application/json')
+        return res.status_code, json.loads(res.data)
+
+    def day(self, day, user=5):
+        return self.send('get', '/workout/all/' + day, user)[1]['all_workouts']
+
+    def test_series_expanded(self):
+        workouts = self.day('2017-11-30')
+        self.assertEqual([w['id'] for w in workouts], [None, 1, 2, 3])
+        self.assertEqual(workouts[0], {
+            'id': None,
+            'coach_name': 'Manni',
+            'coach_id': '4',
+            'description': 'Morning',
+            'date_time': 'Thu, 30 Nov 2017 07:00:00 GMT',
+            'attending': 0,
+            'capacity': 2,
+            'waitlisted': 0,
+            'series_id': self.series_id
+        })
+        self.assertEqual(self.day('2017-11-16'), [])
+        self.assertEqual(self.day('2018-11-29')[0]['description'], 'Morning')
+        status, data = self.send('get', '/workout/range/2017-11-27/2017-12-10', 5)
+        self.assertEqual(len(data['all_workouts']['2017-12-07']), 1)
+        coach_day = self.send('get', '/workout/coach/2017-11-30', 3)[1]['all_workouts']
+        self.assertEqual([w['id'] for w in coach_day], [None, 1, 3])
+        self.assertEqual(self.send('get', '/workout/coach/2017-11-30', 4)[1]['all_workouts'][0]['id'], 2)
+        self.assertEqual(Workout.query.count(), 4)
+
+    def test_series_booking_materializes(self):
+        url = '/workout/series/{0}/2017-11-30'.format(self.series_id)
+        self.assertEqual(self.send('get', url, 0), (200, {'error': error_codes.no_error, 'message': 'attended'}))
+        self.assertEqual(self.send('get', url, 1), (200, {'error': error_codes.no_error, 'message': 'attended'}))
+        self.assertEqual(self.send('get', url, 2), (400, {'error': error_codes.workout_is_full}))
+        self.assertEqual(Workout.query.filter_by(series_id=self.series_id).count(), 1)
+        workouts = self.day('2017-11-30')
+        self.assertEqual((workouts[0]['id'], workouts[0]['attending']), (5, 2))
+        self.assertEqual(len(workouts), 4)
+        self.assertEqual(self.send('get', url, 0), (200, {'error': error_codes.no_error, 'message': 'removed'}))
+        self.assertEqual(self.day('2017-12-07')[0]['id'], None)
+
+    def test_series_edit_one_occurrence(self):
+        url = '/admin/workout/series/{0}/2017-11-30'.format(self.series_id)
+        self.assertEqual(self.send('post', url, 5), (200, {'error': error_codes.no_error, 'workout_id': 5}))
+        self.assertEqual(self.send('post', url, 5), (200, {'error': error_codes.no_error, 'workout_id': 5}))
+        self.send('put', '/admin/workout/update/5', 5, {'time': '06:00'})
+        workouts = self.day('2017-11-30')
+        self.assertEqual([(w['id'], w['date_time']) for w in workouts[:2]],
+                         [(5, 'Thu, 30 Nov 2017 06:00:00 GMT'), (1, 'Thu, 30 Nov 2017 08:00:00 GMT')])
+
+    def test_series_update_forever(self):
+        self.send('get', '/workout/series/{0}/2017-11-30'.format(self.series_id), 0)
+        url = '/admin/workout/series/{0}'.format(self.series_id)
+        body = {'time': '06:30', 'description': 'Early', 'coach_id': self.open_ids[4]}
+        self.assertEqual(self.send('put', url, 5, body), (200, {'error': error_codes.no_error}))
+        workout = self.day('2017-12-07')[0]
+        self.assertEqual((workout['date_time'], workout['description'], workout['coach_name']),
+                         ('Thu, 07 Dec 2017 06:30:00 GMT', 'Early', 'Johann'))
+        self.assertEqual(self.day('2017-11-30')[0]['description'], 'Morning')
+
+    def test_series_cancel(self):
+        url = '/admin/workout/series/{0}/2017-12-07'.format(self.series_id)
+        self.assertEqual(self.send('delete', url, 5), (200, {'error': error_codes.no_error}))
+        self.assertEqual(self.day('2017-12-07'), [])
+        self.assertEqual(self.send('get', '/workout/series/{0}/2017-12-07'.format(self.series_id), 0),
+                         (400, {'error': error_codes.no_such_workout}))
+        self.send('get', '/workout/series/{0}/2017-11-30'.format(self.series_id), 0)
+        url = '/admin/workout/series/{0}?from=2017-11-21'.format(self.series_id)
+        self.assertEqual(self.send('delete', url, 5), (200, {'error': error_codes.no_error}))
+        self.assertEqual(self.day('2017-12-14'), [])
+        self.assertEqual(self.day('2017-11-30')[0]['id'], 5)
+
+    def test_series_collisions(self):
+        body = {'coach_id': self.open_ids[4], 'description': 'Clash', 'date': '07/12/2017', 'time': '07:00'}
+        self.assertEqual(self.send('post', '/workout', 5, body), (400, {'error': error_codes.workout_already_exists}))
+        body = {'from': '2017-12-04', 'to': '2017-12-10',
+                'classes': [{'weekday': 3, 'time': '07:00', 'coach_id': self.open_ids[4], 'description': 'Clash'}]}
+        self.assertEqual(self.send('post', '/workout/template', 5, body), (200, {
+            'error': error_codes.no_error, 'created': 0,
+            'conflicts': [{'date_time': 'Thu, 07 Dec 2017 07:00:00 GMT', 'class': 0}]
+        }))
+        self.send('delete', '/admin/workout/series/{0}/2017-12-07'.format(self.series_id), 5)
+        body = {'coach_id': self.open_ids[4], 'description': 'Clash', 'date': '07/12/2017', 'time': '07:00'}
+        self.assertEqual(self.send('post', '/workout', 5, body), (200, {'error': error_codes.no_error}))
+
+    def test_series_collides_with_workouts(self):
+        body = {'weekday': 3, 'time': '12:00', 'coach_id': self.open_ids[4], 'description': 'Noon',
+                'from': '2017-11-01'}
+        self.assertEqual(self.send('post', '/workout/series', 5, body),
+                         (400, {'error': error_codes.workout_already_exists}))
+        self.assertEqual(self.send('put', '/admin/workout/update/2', 5, {'date': '25/01/2018', 'time': '07:00'}),
+                         (400, {'error': error_codes.workout_already_exists}))
+        self.assertEqual(self.send('put', '/admin/workout/update/2', 5, {'date': '25/01/2018', 'time': '09:00'}),
+                         (200, {'error': error_codes.no_error}))
+        url = '/admin/workout/series/{0}'.format(self.series_id)
+        self.assertEqual(self.send('put', url, 5, {'time': '09:00'}), (400, {'error': error_codes.workout_already_exists}))
+        self.send('delete', '/admin/workout/series/{0}/2018-01-25'.format(self.series_id), 5)
+        self.assertEqual(self.send('put', url, 5, {'time': '09:00'}), (200, {'error': error_codes.no_error}))
+
+    def test_series_hidden_by_other_coach(self):
+        db.session.add(Workout(id=5, coach_id=5, date_time=datetime.datetime(2017, 12, 14, 7), description='Other'))
+        db.session.commit()
+        self.assertEqual([w['id'] for w in self.day('2017-12-14')], [5])
+        self.assertEqual(self.send('get', '/workout/coach/2017-12-14', 3)[1]['all_workouts'], [])
+
+    def test_series_invalid(self):
+        self.assertEqual(self.send('get', '/workout/series/{0}/2017-11-29'.format(self.series_id), 0),
+                         (400, {'error': error_codes.no_such_workout}))
+        self.assertEqual(self.send('get', '/workout/series/{0}/2017-11-16'.format(self.series_id), 0),
+                         (400, {'error': error_codes.no_such_workout}))
+        body = {'weekday': 3, 'time': '07:00', 'coach_id': self.open_ids[4], 'description': 'Clash',
+                'from': '2017-12-01'}
+        self.assertEqual(self.send('post', '/workout/series', 5, body),
+                         (400, {'error': error_codes.workout_already_exists}))
+        body['to'] = '2017-11-01'
+        self.assertEqual(self.send('post', '/workout/series', 5, body),
+                         (400, {'error': error_codes.invalid_date_range}))
+        for key, value in (('to', None), ('from', 20171201)):
+            self.assertEqual(self.send('post', '/workout/series', 5, dict(body, **{key: value})),
+                             (400, {'error': error_codes.invalid_date_time}))
+        self.assertEqual(self.send('post', '/workout/series', 0, body), (403, {'error': error_codes.access_denied}))
+
+
+if __name__ == '__main__':
+    unittest.main()